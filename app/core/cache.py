@@ -0,0 +1,101 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+from app.core.config import RECIPIENT_CACHE_TTL_SECONDS, USER_CACHE_MAX_SIZE, USER_CACHE_TTL_SECONDS
+
+
+class TTLCache:
+    """
+    A small in-process LRU cache with per-entry expiry.
+    - Entries expire `ttl_seconds` after they were stored.
+    - The least recently used entry is evicted once `max_size` is reached.
+    - Values are deep-copied on the way in and out so callers can mutate what they get back.
+    """
+
+    def __init__(self, max_size: int, ttl_seconds: float):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return copy.deepcopy(value)
+
+    def set(self, key: Hashable, value: Any):
+        value = copy.deepcopy(value)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key: Hashable):
+        with self._lock:
+            if self._entries.pop(key, None) is not None:
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+# Authenticated users keyed by str(user_id). Filled by get_current_user and
+# invalidated by every write that can change a user document.
+user_cache = TTLCache(max_size=USER_CACHE_MAX_SIZE, ttl_seconds=USER_CACHE_TTL_SECONDS)
+
+
+def invalidate_user(user_id):
+    """
+    Drop a user from the cache after their document has changed.
+    """
+    user_cache.invalidate(str(user_id))
+
+
+# Fields of a user document that decide whether, and where, they receive role broadcasts.
+RECIPIENT_FIELDS = ("role", "status", "fcm_token")
+
+# Broadcast recipients ({_id, fcm_token} of every user) keyed by (role, status).
+# Filled by UserRepository.get_recipients and cleared by any write touching RECIPIENT_FIELDS.
+recipient_cache = TTLCache(max_size=32, ttl_seconds=RECIPIENT_CACHE_TTL_SECONDS)
+
+
+def invalidate_recipients():
+    """
+    Drop every cached recipient list. A role or status change moves a user between
+    lists, so all of them are cleared rather than tracking which ones they were on.
+    """
+    recipient_cache.clear()
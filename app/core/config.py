@@ -14,6 +14,88 @@ GOOGLE_CLOUD_BUCKET_NAME = os.getenv('GOOGLE_CLOUD_BUCKET_NAME')
 GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
 FIREBASE_SERVICE_ACCOUNT_KEY_JSON = os.getenv('FIREBASE_SERVICE_ACCOUNT_KEY_JSON')
 
+# In-process cache of authenticated users (see app/core/cache.py)
+USER_CACHE_MAX_SIZE = int(os.getenv('USER_CACHE_MAX_SIZE', 10000))
+USER_CACHE_TTL_SECONDS = float(os.getenv('USER_CACHE_TTL_SECONDS', 60))
+# Cached notification recipients per role (see app/core/cache.py)
+RECIPIENT_CACHE_TTL_SECONDS = float(os.getenv('RECIPIENT_CACHE_TTL_SECONDS', 300))
+
+# Bcrypt hashing pool (see app/core/security.py)
+PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', 2))
+PASSWORD_HASH_QUEUE_LIMIT = int(os.getenv('PASSWORD_HASH_QUEUE_LIMIT', 32))
+
+# Apply app/database/indexes.py on startup; disable when indexes are managed out of band
+ENSURE_INDEXES_ON_STARTUP = os.getenv('ENSURE_INDEXES_ON_STARTUP', 'true').lower() == 'true'
+
+# Messages per chat bucket document (see app/repositories/chat_repository.py)
+CHAT_BUCKET_SIZE = int(os.getenv('CHAT_BUCKET_SIZE', 100))
+# Newest buckets whose history is replayed to the model on each turn, after the opening turn
+CHAT_CONTEXT_BUCKETS = int(os.getenv('CHAT_CONTEXT_BUCKETS', 2))
+
+# Batched FCM delivery (see app/core/push_dispatcher.py)
+FCM_BATCH_SIZE = int(os.getenv('FCM_BATCH_SIZE', 500))
+FCM_FLUSH_INTERVAL_SECONDS = float(os.getenv('FCM_FLUSH_INTERVAL_SECONDS', 0.5))
+FCM_QUEUE_LIMIT = int(os.getenv('FCM_QUEUE_LIMIT', 10000))
+
+# Notification outbox delivery (see app/services/outbox_worker.py)
+OUTBOX_BATCH_SIZE = int(os.getenv('OUTBOX_BATCH_SIZE', 100))
+OUTBOX_POLL_INTERVAL_SECONDS = float(os.getenv('OUTBOX_POLL_INTERVAL_SECONDS', 5))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv('OUTBOX_MAX_ATTEMPTS', 8))
+OUTBOX_BACKOFF_BASE_SECONDS = float(os.getenv('OUTBOX_BACKOFF_BASE_SECONDS', 2))
+OUTBOX_BACKOFF_MAX_SECONDS = float(os.getenv('OUTBOX_BACKOFF_MAX_SECONDS', 600))
+OUTBOX_LEASE_SECONDS = float(os.getenv('OUTBOX_LEASE_SECONDS', 60))
+OUTBOX_RETENTION_DAYS = int(os.getenv('OUTBOX_RETENTION_DAYS', 7))
+# Coalesce bursts of broadcast notifications per (recipient, type) into one digest; 0 disables
+NOTIFICATION_DIGEST_WINDOW_SECONDS = float(os.getenv('NOTIFICATION_DIGEST_WINDOW_SECONDS', 300))
+# How long a user's unread counter is trusted before it is recounted from the collection
+NOTIFICATION_UNREAD_RESEED_SECONDS = float(os.getenv('NOTIFICATION_UNREAD_RESEED_SECONDS', 3600))
+
+# Notification retention (see app/services/notification_compactor.py)
+NOTIFICATION_COMPACT_AFTER_DAYS = int(os.getenv('NOTIFICATION_COMPACT_AFTER_DAYS', 30))
+# TTL on read_at, a backstop for notifications the compactor missed; kept at least 30 days
+# past NOTIFICATION_COMPACT_AFTER_DAYS so it never deletes what is still due for a rollup
+NOTIFICATION_RETENTION_DAYS = max(int(os.getenv('NOTIFICATION_RETENTION_DAYS', 90)), NOTIFICATION_COMPACT_AFTER_DAYS + 30)
+NOTIFICATION_ARCHIVE_ENABLED = os.getenv('NOTIFICATION_ARCHIVE_ENABLED', 'false').lower() == 'true'
+NOTIFICATION_COMPACTION_INTERVAL_SECONDS = float(os.getenv('NOTIFICATION_COMPACTION_INTERVAL_SECONDS', 6 * 3600))
+NOTIFICATION_COMPACTION_BATCH_SIZE = int(os.getenv('NOTIFICATION_COMPACTION_BATCH_SIZE', 1000))
+
+# Connections kept open to Cloud Storage by the shared client (see app/core/google_cloud.py)
+GCS_HTTP_POOL_SIZE = int(os.getenv('GCS_HTTP_POOL_SIZE', 32))
+# Concurrent transfers per worker, transfers allowed to wait, and per-transfer timeout
+GCS_UPLOAD_WORKERS = int(os.getenv('GCS_UPLOAD_WORKERS', 8))
+GCS_UPLOAD_QUEUE_LIMIT = int(os.getenv('GCS_UPLOAD_QUEUE_LIMIT', 32))
+GCS_UPLOAD_TIMEOUT_SECONDS = float(os.getenv('GCS_UPLOAD_TIMEOUT_SECONDS', 60))
+
+# Attachment storage (see app/core/storage.py): "gcs", or "local" for development and tests
+STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'gcs').lower()
+LOCAL_STORAGE_ROOT = os.getenv('LOCAL_STORAGE_ROOT', './storage')
+LOCAL_STORAGE_BASE_URL = os.getenv('LOCAL_STORAGE_BASE_URL', 'http://localhost:8000/api/storage')
+SIGNED_URL_EXPIRY_SECONDS = int(os.getenv('SIGNED_URL_EXPIRY_SECONDS', 900))
+MAX_ATTACHMENT_BYTES = int(os.getenv('MAX_ATTACHMENT_BYTES', 20 * 1024 * 1024))
+
+# Upload ingestion (see app/core/uploads.py): largest multipart body accepted, upload bytes a worker
+# holds at once, and where attachments spool once they outgrow UPLOAD_SPOOL_MEMORY_BYTES
+MAX_UPLOAD_REQUEST_BYTES = int(os.getenv('MAX_UPLOAD_REQUEST_BYTES', 2 * MAX_ATTACHMENT_BYTES + 1024 * 1024))
+UPLOAD_WORKER_BUDGET_BYTES = int(os.getenv('UPLOAD_WORKER_BUDGET_BYTES', 256 * 1024 * 1024))
+UPLOAD_SPOOL_DIR = os.getenv('UPLOAD_SPOOL_DIR') or None
+UPLOAD_SPOOL_MEMORY_BYTES = int(os.getenv('UPLOAD_SPOOL_MEMORY_BYTES', 1024 * 1024))
+
+# Image derivatives (see app/core/images.py): worker processes, renders allowed to wait,
+# longest edge in pixels of each variant, and their JPEG quality
+IMAGE_WORKERS = int(os.getenv('IMAGE_WORKERS', 2))
+IMAGE_QUEUE_LIMIT = int(os.getenv('IMAGE_QUEUE_LIMIT', 16))
+IMAGE_THUMBNAIL_SIZE = int(os.getenv('IMAGE_THUMBNAIL_SIZE', 256))
+IMAGE_MODEL_SIZE = int(os.getenv('IMAGE_MODEL_SIZE', 1024))
+IMAGE_WEB_SIZE = int(os.getenv('IMAGE_WEB_SIZE', 2048))
+IMAGE_JPEG_QUALITY = int(os.getenv('IMAGE_JPEG_QUALITY', 82))
+
+# Live notification streams (see app/core/notification_hub.py)
+NOTIFICATION_STREAM_MAX_CONNECTIONS = int(os.getenv('NOTIFICATION_STREAM_MAX_CONNECTIONS', 1000))
+NOTIFICATION_STREAM_MAX_PER_USER = int(os.getenv('NOTIFICATION_STREAM_MAX_PER_USER', 5))
+NOTIFICATION_STREAM_QUEUE_SIZE = int(os.getenv('NOTIFICATION_STREAM_QUEUE_SIZE', 100))
+NOTIFICATION_STREAM_HEARTBEAT_SECONDS = float(os.getenv('NOTIFICATION_STREAM_HEARTBEAT_SECONDS', 15))
+NOTIFICATION_STREAM_IDLE_TIMEOUT_SECONDS = float(os.getenv('NOTIFICATION_STREAM_IDLE_TIMEOUT_SECONDS', 600))
+
 class Settings(BaseSettings):
     GCS_SERVICE_ACCOUNT_KEY_JSON: str = GCS_SERVICE_ACCOUNT_KEY_JSON
     GOOGLE_CLOUD_BUCKET_NAME: str = GOOGLE_CLOUD_BUCKET_NAME
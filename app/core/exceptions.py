@@ -36,4 +36,48 @@ class TicketNotFoundException(Exception):
 
 class NotificationException(Exception):
     """Raised when there is an error with notification"""
-    pass
\ No newline at end of file
+    pass
+
+class NotificationNotFoundException(Exception):
+    """Raised when a notification does not exist or belongs to another user."""
+    pass
+
+class HashingCapacityException(Exception):
+    """Raised when the password hashing pool is saturated and cannot accept more work."""
+    pass
+
+class InvalidCursorException(Exception):
+    """Raised when a pagination cursor is malformed or was not issued by this API."""
+    pass
+
+class ChatSessionConflictException(Exception):
+    """Raised when a chat session changed between reading it and persisting a new turn."""
+    pass
+
+class StreamCapacityException(Exception):
+    """Raised when no more live notification streams can be opened on this worker."""
+    pass
+
+class StorageCapacityException(Exception):
+    """Raised when the file transfer pool is saturated and cannot accept more uploads."""
+    pass
+
+class StorageTimeoutException(Exception):
+    """Raised when a file upload or download does not finish within its timeout."""
+    pass
+
+class InvalidAttachmentException(Exception):
+    """Raised when an uploaded attachment does not match what was issued for the ticket."""
+    pass
+
+class AttachmentNotFoundException(Exception):
+    """Raised when a confirmed attachment has not been uploaded to storage."""
+    pass
+
+class AttachmentTooLargeException(Exception):
+    """Raised when an attachment is larger than MAX_ATTACHMENT_BYTES."""
+    pass
+
+class ImageProcessingCapacityException(Exception):
+    """Raised when the image processing pool is saturated and cannot accept more work."""
+    pass
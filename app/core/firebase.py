@@ -18,4 +18,16 @@ def initialize_firebase():
         cred = credentials.Certificate(service_account_key)
         firebase_admin.initialize_app(cred)
     else:
-        raise ValueError("FIREBASE_SERVICE_ACCOUNT_KEY_JSON environment variable is not set.")
\ No newline at end of file
+        raise ValueError("FIREBASE_SERVICE_ACCOUNT_KEY_JSON environment variable is not set.")
+
+def build_fcm_message(fcm_token: str, message: str, type: str) -> messaging.Message:
+    """
+    Build the push message for a notification of the given type.
+    """
+    return messaging.Message(
+        notification=messaging.Notification(
+            title=f"New {type.replace('_', ' ').title()}",  # Convert type to a readable title
+            body=message,
+        ),
+        token=fcm_token,
+    )
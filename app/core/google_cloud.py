@@ -1,10 +1,35 @@
+import asyncio
 import json
-import mimetypes
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+from google.auth.transport.requests import AuthorizedSession
 from google.cloud import storage
 from google.oauth2 import service_account
-from app.core.config import settings
-import os
-import uuid
+from requests.adapters import HTTPAdapter
+from app.core.config import (
+    GCS_HTTP_POOL_SIZE,
+    GCS_UPLOAD_QUEUE_LIMIT,
+    GCS_UPLOAD_TIMEOUT_SECONDS,
+    GCS_UPLOAD_WORKERS,
+    settings,
+)
+from app.core.exceptions import StorageCapacityException, StorageTimeoutException
+from app.core.metrics import LatencyRecorder
+
+_client: Optional[storage.Client] = None
+_buckets: Dict[str, storage.Bucket] = {}
+_client_lock = threading.Lock()
+
+# Uploads and downloads are blocking HTTP calls; they run on this pool, never on the event loop.
+_storage_executor = ThreadPoolExecutor(max_workers=GCS_UPLOAD_WORKERS, thread_name_prefix="gcs")
+_pending_storage_jobs = 0
+# Jobs finish on pool threads, so the pending count is updated under a lock
+_storage_jobs_lock = threading.Lock()
+_rejected_storage_jobs = 0
+_timed_out_storage_jobs = 0
+storage_latency = LatencyRecorder()
 
 # Initialize GCS client
 def initialize_gcs_client():
@@ -17,70 +42,98 @@ def initialize_gcs_client():
 
         # Initialize GCS client with the credentials
         credentials = service_account.Credentials.from_service_account_info(gcs_credentials)
-        client = storage.Client(credentials=credentials)
+
+        # One authorized session per process: the access token is cached on the credentials
+        # and refreshed only when it expires, and connections are pooled and kept alive
+        session = AuthorizedSession(credentials)
+        adapter = HTTPAdapter(pool_connections=GCS_HTTP_POOL_SIZE, pool_maxsize=GCS_HTTP_POOL_SIZE)
+        session.mount("https://", adapter)
+
+        client = storage.Client(project=credentials.project_id, credentials=credentials, _http=session)
         return client
     else:
         raise ValueError("GCS_SERVICE_ACCOUNT_KEY_JSON environment variable is not set.")
 
 
-# Upload file to GCS
-async def upload_ticket_to_gcs(bucket_name: str, file, ticket_id: str, file_type: str):
-    client = initialize_gcs_client()
-    bucket = client.bucket(bucket_name)
-
-    # Generate a unique filename
-    file_extension = os.path.splitext(file.filename)[1]
-    unique_filename = f"{uuid.uuid4()}{file_extension}"
-
-    # Generate file path
-    file_path = f"tickets/{ticket_id}/{file_type}/{unique_filename}"
-
-    # Detect content type using the provided content type or by guessing from the filename
-    content_type = file.content_type or mimetypes.guess_type(file.filename)[0] or "application/octet-stream"
-
-    # Upload file with correct MIME type
-    blob = bucket.blob(file_path)
-    blob.upload_from_file(file.file, content_type=content_type)
-
-    # Make the file publicly accessible
-    blob.make_public()
-
-    # Return the public URL
-    return blob.public_url
-
-async def upload_report_file_to_gcs(bucket_name: str, file, ticket_id: str, file_type: str):
+def get_gcs_client() -> storage.Client:
     """
-    Upload a report file (image or document) to Google Cloud Storage.
+    Return the process-wide GCS client, creating it on first use.
     """
-    client = initialize_gcs_client()
-    bucket = client.bucket(bucket_name)
-
-    # Generate a unique filename
-    file_extension = os.path.splitext(file.filename)[1]
-    unique_filename = f"{uuid.uuid4()}{file_extension}"
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = initialize_gcs_client()
+    return _client
 
-    # Generate file path
-    file_path = f"tickets/{ticket_id}/reports/{unique_filename}"
 
-    # Detect content type using the provided content type or by guessing from the filename
-    content_type = file.content_type or mimetypes.guess_type(file.filename)[0] or "application/octet-stream"
+def get_gcs_bucket(bucket_name: Optional[str] = None) -> storage.Bucket:
+    """
+    Return a cached bucket handle on the shared client (the configured bucket by default).
+    """
+    bucket_name = bucket_name or settings.GOOGLE_CLOUD_BUCKET_NAME
+    bucket = _buckets.get(bucket_name)
+    if bucket is None:
+        bucket = _buckets.setdefault(bucket_name, get_gcs_client().bucket(bucket_name))
+    return bucket
 
-    # Upload file with correct MIME type
-    blob = bucket.blob(file_path)
-    blob.upload_from_file(file.file, content_type=content_type)
 
-    # Make the file publicly accessible
-    blob.make_public()
+def _storage_job_done(_future):
+    global _pending_storage_jobs
+    with _storage_jobs_lock:
+        _pending_storage_jobs -= 1
 
-    # Return the public URL
-    return blob.public_url
 
-def download_file_from_gcs(url: str) -> bytes:
+async def run_storage_job(func, *args):
     """
-    Download a file from Google Cloud Storage.
+    Run a blocking storage call on the upload pool.
+    - At most GCS_UPLOAD_WORKERS calls run at once; once GCS_UPLOAD_QUEUE_LIMIT are queued
+      or running, new ones are rejected with StorageCapacityException.
+    - Calls running longer than GCS_UPLOAD_TIMEOUT_SECONDS (time spent queued does not count)
+      raise StorageTimeoutException. The call itself cannot be interrupted, so it stays
+      pending until its thread actually finishes.
     """
-    client = storage.Client()
-    bucket_name, blob_name = url.replace("https://storage.googleapis.com/", "").split("/", 1)
-    bucket = client.bucket(bucket_name)
-    blob = bucket.blob(blob_name)
-    return blob.download_as_bytes()
\ No newline at end of file
+    global _pending_storage_jobs, _rejected_storage_jobs, _timed_out_storage_jobs
+    with _storage_jobs_lock:
+        if _pending_storage_jobs >= GCS_UPLOAD_QUEUE_LIMIT:
+            _rejected_storage_jobs += 1
+            raise StorageCapacityException("Too many uploads in progress, please retry shortly")
+        _pending_storage_jobs += 1
+
+    loop = asyncio.get_running_loop()
+    started = asyncio.Event()
+
+    def job():
+        loop.call_soon_threadsafe(started.set)
+        started_at = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            storage_latency.record(time.perf_counter() - started_at)
+
+    future = _storage_executor.submit(job)
+    # Runs when the job finishes, or when it is cancelled before it started
+    future.add_done_callback(_storage_job_done)
+    result = asyncio.wrap_future(future)
+    try:
+        await started.wait()
+        return await asyncio.wait_for(asyncio.shield(result), GCS_UPLOAD_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        _timed_out_storage_jobs += 1
+        raise StorageTimeoutException("File transfer timed out")
+    except asyncio.CancelledError:
+        # Drop the job if it is still queued
+        future.cancel()
+        raise
+
+
+def storage_stats() -> dict:
+    return {
+        "workers": GCS_UPLOAD_WORKERS,
+        "queue_limit": GCS_UPLOAD_QUEUE_LIMIT,
+        "pending": _pending_storage_jobs,
+        "rejected": _rejected_storage_jobs,
+        "timed_out": _timed_out_storage_jobs,
+        "latency": storage_latency.stats(),
+    }
+
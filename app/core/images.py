@@ -0,0 +1,147 @@
+"""
+Image derivatives rendered when an image is uploaded.
+
+- "thumbnail" for list views, "model" (capped resolution) for the chat model, and "web"
+  for full-screen viewing; all are EXIF-oriented, metadata-free JPEGs.
+- Decoding and resizing are CPU-bound and hold the GIL, so they run in a process pool.
+"""
+import asyncio
+import io
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Iterable, Union
+from PIL import Image, ImageOps
+from app.core.config import (
+    IMAGE_JPEG_QUALITY,
+    IMAGE_MODEL_SIZE,
+    IMAGE_QUEUE_LIMIT,
+    IMAGE_THUMBNAIL_SIZE,
+    IMAGE_WEB_SIZE,
+    IMAGE_WORKERS,
+)
+from app.core.exceptions import ImageProcessingCapacityException
+from app.core.metrics import LatencyRecorder
+
+# Longest edge of each variant, in pixels
+IMAGE_VARIANTS = {"thumbnail": IMAGE_THUMBNAIL_SIZE, "model": IMAGE_MODEL_SIZE, "web": IMAGE_WEB_SIZE}
+VARIANT_CONTENT_TYPE = "image/jpeg"
+VARIANT_EXTENSION = ".jpg"
+
+
+def _create_executor() -> ProcessPoolExecutor:
+    # Spawned rather than forked, so workers do not inherit the event loop or database clients
+    return ProcessPoolExecutor(max_workers=IMAGE_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+
+
+_image_executor = _create_executor()
+_pending_image_jobs = 0
+# Jobs finish on the pool's management thread, so the pending count is guarded
+_image_jobs_lock = threading.Lock()
+_rejected_image_jobs = 0
+_failed_image_jobs = 0
+image_latency = LatencyRecorder()
+
+
+def _image_job_done(_future):
+    global _pending_image_jobs
+    with _image_jobs_lock:
+        _pending_image_jobs -= 1
+
+
+def _to_rgb(img: Image.Image) -> Image.Image:
+    # JPEG has no alpha channel; flatten transparent images onto white
+    if img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info):
+        img = img.convert("RGBA")
+        background = Image.new("RGB", img.size, (255, 255, 255))
+        background.paste(img, mask=img.getchannel("A"))
+        return background
+    return img.convert("RGB")
+
+
+def render_variants(source: Union[str, bytes], names: Iterable[str]) -> Dict[str, bytes]:
+    """
+    Render the named variants of an encoded image, given as a file path or its bytes
+    (blocking; runs in a worker process).
+    """
+    sizes = sorted(((IMAGE_VARIANTS[name], name) for name in names), reverse=True)
+    with Image.open(source if isinstance(source, str) else io.BytesIO(source)) as img:
+        # JPEGs can be decoded straight at a reduced scale, which is much cheaper than a full decode
+        img.draft("RGB", (sizes[0][0], sizes[0][0]))
+        img = _to_rgb(ImageOps.exif_transpose(img))
+
+    rendered = {}
+    # Largest first, each smaller variant resized from the one before it
+    for size, name in sizes:
+        img.thumbnail((size, size), Image.Resampling.LANCZOS)
+        buffer = io.BytesIO()
+        img.save(buffer, "JPEG", quality=IMAGE_JPEG_QUALITY, optimize=True, progressive=True)
+        rendered[name] = buffer.getvalue()
+    return rendered
+
+
+async def render_image_variants(
+    source: Union[str, bytes], names: Iterable[str] = tuple(IMAGE_VARIANTS)
+) -> Dict[str, bytes]:
+    """
+    Render image variants on the process pool.
+    - Pass large images as a path (see app.core.uploads.worker_file) so only the path is
+      sent to the worker, which opens the file itself.
+    - Rejects the job up front once IMAGE_QUEUE_LIMIT jobs are queued or running; a job
+      keeps its slot until the pool is done with it, even if the caller is cancelled.
+    - A cancelled caller waits for a job that has already started, so a path it passed
+      (e.g. worker_file's temporary copy) stays readable until the worker is done with it.
+    - Raises whatever PIL raises for data that is not a readable image.
+    """
+    global _image_executor, _pending_image_jobs, _rejected_image_jobs, _failed_image_jobs
+    with _image_jobs_lock:
+        if _pending_image_jobs >= IMAGE_QUEUE_LIMIT:
+            _rejected_image_jobs += 1
+            raise ImageProcessingCapacityException("Too many images being processed, please retry shortly")
+        _pending_image_jobs += 1
+
+    started_at = time.perf_counter()
+    executor = _image_executor
+    try:
+        try:
+            future = executor.submit(render_variants, source, tuple(names))
+        except BaseException:
+            _image_job_done(None)
+            raise
+        future.add_done_callback(_image_job_done)
+        try:
+            return await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            # Drop the job if it is still queued, otherwise let the worker finish with `source`
+            if not future.cancel():
+                await asyncio.wait([asyncio.wrap_future(future)])
+            raise
+    except BrokenProcessPool:
+        # A worker died (e.g. killed for memory); later jobs get a fresh pool
+        _failed_image_jobs += 1
+        if _image_executor is executor:
+            _image_executor = _create_executor()
+            executor.shutdown(wait=False, cancel_futures=True)
+        raise
+    except Exception:
+        _failed_image_jobs += 1
+        raise
+    finally:
+        image_latency.record(time.perf_counter() - started_at)
+
+
+def shutdown_image_pool():
+    _image_executor.shutdown(wait=False, cancel_futures=True)
+
+
+def image_stats() -> dict:
+    return {
+        "workers": IMAGE_WORKERS,
+        "queue_limit": IMAGE_QUEUE_LIMIT,
+        "pending": _pending_image_jobs,
+        "rejected": _rejected_image_jobs,
+        "failed": _failed_image_jobs,
+        "latency": image_latency.stats(),
+    }
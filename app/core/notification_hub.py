@@ -0,0 +1,123 @@
+import asyncio
+from collections import defaultdict, deque
+from typing import Any, Deque, Dict, Optional
+from app.core.config import (
+    NOTIFICATION_STREAM_MAX_CONNECTIONS,
+    NOTIFICATION_STREAM_MAX_PER_USER,
+    NOTIFICATION_STREAM_QUEUE_SIZE,
+)
+from app.core.exceptions import StreamCapacityException
+
+# Control messages put on a subscription's queue in place of an event.
+CLOSED = object()  # The hub closed the subscription (replaced by a newer one, or shutdown)
+OVERFLOWED = object()  # The client fell too far behind; it should reconnect and resync
+
+
+class Subscription:
+    """
+    One connected stream. Events are read from `queue`; a control object
+    (CLOSED / OVERFLOWED) is the last item ever put on it.
+    """
+
+    def __init__(self, user_id: str, queue_size: int):
+        self.user_id = user_id
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.closed = False
+
+    def _close(self, reason: object):
+        if self.closed:
+            return
+        self.closed = True
+        # Make room so the control object always fits, discarding undelivered events
+        while self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait(reason)
+
+
+class NotificationHub:
+    """
+    In-process pub/sub for live notifications, keyed by user_id.
+    - Each subscription has a bounded queue. A client that falls `queue_size` events
+      behind is closed with OVERFLOWED instead of buffering without limit.
+    - At most `max_per_user` streams per user (the oldest is closed when another opens)
+      and `max_connections` in total (StreamCapacityException beyond that).
+    - Only clients connected to this process receive its events, so clients should
+      fetch GET /notifications when they (re)connect.
+    """
+
+    def __init__(self, max_connections: int, max_per_user: int, queue_size: int):
+        self.max_connections = max_connections
+        self.max_per_user = max_per_user
+        self.queue_size = queue_size
+        self._subscriptions: Dict[str, Deque[Subscription]] = defaultdict(deque)
+        self._connections = 0
+        self.published = 0
+        self.delivered = 0
+        self.overflows = 0
+        self.rejected = 0
+
+    def subscribe(self, user_id) -> Subscription:
+        user_id = str(user_id)
+        subscriptions = self._subscriptions[user_id]
+        while len(subscriptions) >= self.max_per_user:
+            self._remove(subscriptions[0], CLOSED)
+        if self._connections >= self.max_connections:
+            self.rejected += 1
+            if not subscriptions:
+                del self._subscriptions[user_id]
+            raise StreamCapacityException("Too many open notification streams, please retry later")
+
+        subscription = Subscription(user_id, self.queue_size)
+        subscriptions.append(subscription)
+        self._connections += 1
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        self._remove(subscription, CLOSED)
+
+    def publish(self, user_id, event: Any):
+        """
+        Hand an event to every stream the user has open on this process, without waiting.
+        """
+        self.published += 1
+        for subscription in list(self._subscriptions.get(str(user_id), ())):
+            try:
+                subscription.queue.put_nowait(event)
+                self.delivered += 1
+            except asyncio.QueueFull:
+                self.overflows += 1
+                self._remove(subscription, OVERFLOWED)
+
+    def close_all(self):
+        """
+        Close every stream, e.g. on shutdown so open responses can finish.
+        """
+        for subscriptions in list(self._subscriptions.values()):
+            for subscription in list(subscriptions):
+                self._remove(subscription, CLOSED)
+
+    def _remove(self, subscription: Subscription, reason: object):
+        subscriptions: Optional[Deque[Subscription]] = self._subscriptions.get(subscription.user_id)
+        if subscriptions is not None and subscription in subscriptions:
+            subscriptions.remove(subscription)
+            self._connections -= 1
+            if not subscriptions:
+                del self._subscriptions[subscription.user_id]
+        subscription._close(reason)
+
+    def stats(self) -> dict:
+        return {
+            "connections": self._connections,
+            "users": len(self._subscriptions),
+            "published": self.published,
+            "delivered": self.delivered,
+            "overflows": self.overflows,
+            "rejected": self.rejected,
+        }
+
+
+notification_hub = NotificationHub(
+    max_connections=NOTIFICATION_STREAM_MAX_CONNECTIONS,
+    max_per_user=NOTIFICATION_STREAM_MAX_PER_USER,
+    queue_size=NOTIFICATION_STREAM_QUEUE_SIZE,
+)
@@ -0,0 +1,168 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, NamedTuple, Optional, Tuple
+from firebase_admin import exceptions, messaging
+from app.core.config import FCM_BATCH_SIZE, FCM_FLUSH_INTERVAL_SECONDS, FCM_QUEUE_LIMIT
+from app.core.metrics import LatencyRecorder
+
+# FCM accepts at most 500 messages per send_each call
+_FCM_MAX_BATCH = 500
+_STOP = object()
+
+
+# Errors meaning the token itself will never work again (app uninstalled, token
+# malformed or issued for another sender), as opposed to transient failures.
+_DEAD_TOKEN_ERRORS = (messaging.UnregisteredError, messaging.SenderIdMismatchError, exceptions.InvalidArgumentError)
+
+
+def is_dead_token_error(error: Optional[Exception]) -> bool:
+    return isinstance(error, _DEAD_TOKEN_ERRORS)
+
+
+class PushResult(NamedTuple):
+    success: bool
+    error: Optional[Exception] = None
+    dead_token: bool = False
+
+
+class PushDispatcher:
+    """
+    Collects outgoing FCM messages and sends them in batches off the event loop.
+    - A batch is flushed when it reaches `batch_size` or `flush_interval` seconds after
+      its first message, whichever comes first.
+    - Batches go through `messaging.send_each` on a dedicated worker thread, so the
+      blocking HTTPS call never runs on the event loop.
+    - The queue is bounded; when it is full new messages are dropped and counted.
+    - Every queued message gets a future that resolves to its PushResult, for callers
+      that need to know whether delivery succeeded; `dead_token` marks failures caused by a
+      token that will never work again, so callers can stop using it.
+    """
+
+    def __init__(self, batch_size: int, flush_interval: float, queue_limit: int):
+        self.batch_size = max(1, min(batch_size, _FCM_MAX_BATCH))
+        self.flush_interval = flush_interval
+        self.queue_limit = queue_limit
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="fcm")
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self.batch_latency = LatencyRecorder()
+        self.batches = 0
+        self.sent = 0
+        self.failed = 0
+        self.failed_batches = 0
+        self.dead_tokens = 0
+        self.dropped = 0
+
+    def start(self):
+        """
+        Start the background sender on the running event loop (idempotent).
+        """
+        if self._task is None or self._task.done():
+            self._queue = asyncio.Queue(maxsize=self.queue_limit)
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """
+        Flush everything queued so far and stop the background sender.
+        """
+        if self._task is None or self._task.done():
+            return
+        await self._queue.put(_STOP)
+        await self._task
+
+    def enqueue(self, message: messaging.Message) -> Optional[asyncio.Future]:
+        """
+        Queue a message for delivery without waiting for FCM.
+        - Returns a future resolving to the message's PushResult, or None if the
+          message was dropped because the queue is full.
+        """
+        self.start()
+        result = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait((message, result))
+            return result
+        except asyncio.QueueFull:
+            self.dropped += 1
+            print(f"FCM queue full ({self.queue_limit}), dropping push notification")
+            return None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await self._queue.get()
+            if item is _STOP:
+                return
+            batch = [item]
+            stopping = False
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            await self._send_batch(batch)
+            if stopping:
+                return
+
+    async def _send_batch(self, batch: List[Tuple[messaging.Message, asyncio.Future]]):
+        started_at = time.perf_counter()
+        try:
+            response = await asyncio.get_running_loop().run_in_executor(
+                self._executor, messaging.send_each, [message for message, _ in batch]
+            )
+        except Exception as e:
+            self.failed_batches += 1
+            self.failed += len(batch)
+            print(f"Failed to send FCM batch of {len(batch)}: {e}")
+            for _, result in batch:
+                if not result.done():
+                    result.set_result(PushResult(success=False, error=e))
+            return
+        finally:
+            self.batches += 1
+            self.batch_latency.record(time.perf_counter() - started_at)
+
+        self.sent += response.success_count
+        self.failed += response.failure_count
+        for (_, result), send_response in zip(batch, response.responses):
+            dead_token = False
+            if not send_response.success:
+                dead_token = is_dead_token_error(send_response.exception)
+                if dead_token:
+                    self.dead_tokens += 1
+                else:
+                    print(f"Failed to send FCM notification: {send_response.exception}")
+            if not result.done():
+                result.set_result(
+                    PushResult(success=send_response.success, error=send_response.exception, dead_token=dead_token)
+                )
+
+    def stats(self) -> dict:
+        return {
+            "batch_size": self.batch_size,
+            "flush_interval_seconds": self.flush_interval,
+            "queued": self._queue.qsize() if self._queue else 0,
+            "batches": self.batches,
+            "sent": self.sent,
+            "failed": self.failed,
+            "failed_batches": self.failed_batches,
+            "dead_tokens": self.dead_tokens,
+            "dropped": self.dropped,
+            "batch_latency": self.batch_latency.stats(),
+        }
+
+
+push_dispatcher = PushDispatcher(
+    batch_size=FCM_BATCH_SIZE,
+    flush_interval=FCM_FLUSH_INTERVAL_SECONDS,
+    queue_limit=FCM_QUEUE_LIMIT,
+)
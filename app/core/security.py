@@ -1,13 +1,35 @@
 # core/security.py
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import Optional
 import jwt
 from passlib.context import CryptContext
-from app.core.config import ACCESS_TOKEN_EXPIRE_MINUTES, ALGORITHM, SECRET_KEY
+from app.core.config import (
+    ACCESS_TOKEN_EXPIRE_MINUTES,
+    ALGORITHM,
+    SECRET_KEY,
+    PASSWORD_HASH_WORKERS,
+    PASSWORD_HASH_QUEUE_LIMIT,
+)
+from app.core.exceptions import HashingCapacityException
+from app.core.metrics import LatencyRecorder
 
 # Password hashing context
 pwd_context = CryptContext(schemes=['bcrypt'], deprecated='auto')
 
+# Dedicated pool for bcrypt so hashing never runs on the event loop.
+# The bcrypt C extension releases the GIL, so threads hash in parallel.
+_hash_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt")
+_pending_hash_jobs = 0
+# Jobs finish on pool threads, so the pending count is updated under a lock
+_hash_jobs_lock = threading.Lock()
+_rejected_hash_jobs = 0
+hash_latency = LatencyRecorder()
+hash_queue_wait = LatencyRecorder()
+
 # Utility functions
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
@@ -15,6 +37,61 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
 def hash_password(password: str) -> str:
     return pwd_context.hash(password)
 
+def _hash_job_done(_future):
+    global _pending_hash_jobs
+    with _hash_jobs_lock:
+        _pending_hash_jobs -= 1
+
+async def _run_hash_job(func, *args):
+    """
+    Run a bcrypt call on the hashing pool.
+    - Rejects the job up front once PASSWORD_HASH_QUEUE_LIMIT jobs are queued or running.
+      A job counts as pending until its thread finishes, even if the caller stops waiting.
+    - Records time spent waiting for a worker and time spent hashing.
+    """
+    global _pending_hash_jobs, _rejected_hash_jobs
+    with _hash_jobs_lock:
+        if _pending_hash_jobs >= PASSWORD_HASH_QUEUE_LIMIT:
+            _rejected_hash_jobs += 1
+            raise HashingCapacityException("Server is busy, please retry shortly")
+        _pending_hash_jobs += 1
+
+    submitted_at = time.perf_counter()
+
+    def job():
+        started_at = time.perf_counter()
+        hash_queue_wait.record(started_at - submitted_at)
+        try:
+            return func(*args)
+        finally:
+            hash_latency.record(time.perf_counter() - started_at)
+
+    future = _hash_executor.submit(job)
+    # Runs when the job finishes, or when it is cancelled before it started
+    future.add_done_callback(_hash_job_done)
+    try:
+        return await asyncio.wrap_future(future)
+    except asyncio.CancelledError:
+        # Drop the job if it is still queued
+        future.cancel()
+        raise
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await _run_hash_job(verify_password, plain_password, hashed_password)
+
+async def hash_password_async(password: str) -> str:
+    return await _run_hash_job(hash_password, password)
+
+def hashing_stats() -> dict:
+    return {
+        "workers": PASSWORD_HASH_WORKERS,
+        "queue_limit": PASSWORD_HASH_QUEUE_LIMIT,
+        "pending": _pending_hash_jobs,
+        "rejected": _rejected_hash_jobs,
+        "hash_latency": hash_latency.stats(),
+        "queue_wait": hash_queue_wait.stats(),
+    }
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     to_encode = data.copy()
     if expires_delta:
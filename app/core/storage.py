@@ -0,0 +1,309 @@
+"""
+Object storage used for ticket and report attachments.
+
+`storage` is the backend selected by STORAGE_BACKEND: Google Cloud Storage in
+production, or a directory on local disk for development and tests. Services
+receive it through the `get_storage` dependency, so tests can swap it.
+"""
+import asyncio
+import os
+import uuid
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import AsyncIterator, BinaryIO, Dict, NamedTuple, Optional
+from google.api_core.exceptions import NotFound
+import jwt
+from app.core.config import (
+    ALGORITHM,
+    GCS_UPLOAD_TIMEOUT_SECONDS,
+    LOCAL_STORAGE_BASE_URL,
+    LOCAL_STORAGE_ROOT,
+    SECRET_KEY,
+    SIGNED_URL_EXPIRY_SECONDS,
+    STORAGE_BACKEND,
+    settings,
+)
+from app.core.google_cloud import run_storage_job, get_gcs_bucket
+
+STREAM_CHUNK_SIZE = 256 * 1024
+
+
+class UploadTarget(NamedTuple):
+    """Where and how a client uploads a file directly to storage."""
+    url: str
+    method: str
+    headers: Dict[str, str]
+    expires_at: datetime
+
+
+class StoredObject(NamedTuple):
+    path: str
+    size: int
+    content_type: Optional[str]
+
+
+class StorageBackend(ABC):
+    """
+    Interface implemented by every storage backend. Paths are bucket-relative,
+    e.g. "tickets/<ticket_id>/images/<uuid>.png".
+    - Blocking I/O never runs on the event loop.
+    """
+
+    @abstractmethod
+    async def put(self, path: str, file: BinaryIO, content_type: str):
+        """
+        Store the contents of a binary file object (read from its current position) as a public object.
+        """
+
+    @abstractmethod
+    async def get(self, path: str) -> bytes:
+        """
+        Read a whole object. Raises FileNotFoundError if it does not exist.
+        """
+
+    @abstractmethod
+    def stream(self, path: str, chunk_size: int = STREAM_CHUNK_SIZE) -> AsyncIterator[bytes]:
+        """
+        Read an object chunk by chunk (implemented as an async generator). Raises
+        FileNotFoundError if it does not exist.
+        """
+
+    @abstractmethod
+    async def delete(self, path: str) -> bool:
+        """
+        Delete an object; returns False if it did not exist.
+        """
+
+    def path_from_url(self, url: str) -> Optional[str]:
+        """
+        Map a URL returned by public_url back to its path, or None for URLs this backend did not issue.
+        """
+        prefix = self.public_url("")
+        return url[len(prefix):] if url.startswith(prefix) and len(url) > len(prefix) else None
+
+    @abstractmethod
+    async def create_upload_target(
+        self, path: str, content_type: str, max_size: int, expires_in: int = SIGNED_URL_EXPIRY_SECONDS
+    ) -> UploadTarget:
+        """
+        Return a short-lived URL the client can upload `path` to without going through the API.
+        """
+
+    @abstractmethod
+    async def stat(self, path: str) -> Optional[StoredObject]:
+        """
+        Describe a stored object, or return None if it does not exist.
+        """
+
+    @abstractmethod
+    def public_url(self, path: str) -> str:
+        """
+        The public URL of the object at `path`.
+        """
+
+
+class GCSStorage(StorageBackend):
+    """
+    Google Cloud Storage, through the shared client in app/core/google_cloud.py.
+    - Upload URLs are V4 signed PUT URLs; the client must send the returned headers,
+      which make the object public and cap its size.
+    """
+
+    def __init__(self, bucket_name: str):
+        self.bucket_name = bucket_name
+
+    async def create_upload_target(
+        self, path: str, content_type: str, max_size: int, expires_in: int = SIGNED_URL_EXPIRY_SECONDS
+    ) -> UploadTarget:
+        headers = {
+            "Content-Type": content_type,
+            "x-goog-acl": "public-read",
+            "x-goog-content-length-range": f"0,{max_size}",
+        }
+        blob = get_gcs_bucket(self.bucket_name).blob(path)
+        # Signing is local with a service-account key, but may refresh credentials over HTTP
+        url = await run_storage_job(
+            lambda: blob.generate_signed_url(
+                version="v4",
+                expiration=timedelta(seconds=expires_in),
+                method="PUT",
+                content_type=content_type,
+                headers={name: value for name, value in headers.items() if name != "Content-Type"},
+            )
+        )
+        return UploadTarget(url, "PUT", headers, datetime.utcnow() + timedelta(seconds=expires_in))
+
+    async def put(self, path: str, file: BinaryIO, content_type: str):
+        blob = get_gcs_bucket(self.bucket_name).blob(path)
+        # Setting the ACL with the upload saves a separate make_public request
+        await run_storage_job(
+            lambda: blob.upload_from_file(
+                file, content_type=content_type, predefined_acl="publicRead", timeout=GCS_UPLOAD_TIMEOUT_SECONDS
+            )
+        )
+
+    async def get(self, path: str) -> bytes:
+        blob = get_gcs_bucket(self.bucket_name).blob(path)
+        try:
+            return await run_storage_job(lambda: blob.download_as_bytes(timeout=GCS_UPLOAD_TIMEOUT_SECONDS))
+        except NotFound:
+            raise FileNotFoundError(path)
+
+    async def stream(self, path: str, chunk_size: int = STREAM_CHUNK_SIZE) -> AsyncIterator[bytes]:
+        blob = get_gcs_bucket(self.bucket_name).blob(path)
+        # Each chunk is its own ranged request, so a long download never holds a worker for long
+        reader = blob.open("rb", chunk_size=chunk_size)
+        try:
+            while True:
+                try:
+                    chunk = await run_storage_job(reader.read, chunk_size)
+                except NotFound:
+                    raise FileNotFoundError(path)
+                if not chunk:
+                    return
+                yield chunk
+        finally:
+            reader.close()
+
+    async def delete(self, path: str) -> bool:
+        blob = get_gcs_bucket(self.bucket_name).blob(path)
+        try:
+            await run_storage_job(lambda: blob.delete(timeout=GCS_UPLOAD_TIMEOUT_SECONDS))
+            return True
+        except NotFound:
+            return False
+
+    async def stat(self, path: str) -> Optional[StoredObject]:
+        blob = await run_storage_job(get_gcs_bucket(self.bucket_name).get_blob, path)
+        if blob is None:
+            return None
+        return StoredObject(path, blob.size, blob.content_type)
+
+    def public_url(self, path: str) -> str:
+        return f"https://storage.googleapis.com/{self.bucket_name}/{path}"
+
+
+class LocalStorage(StorageBackend):
+    """
+    Files under a local directory, served and accepted by app/routers/storage_router.py.
+    - Upload URLs carry a signed token naming the path, size limit and expiry.
+    """
+
+    TOKEN_PURPOSE = "local-upload"
+
+    def __init__(self, root: str, base_url: str):
+        self.root = Path(root).resolve()
+        self.base_url = base_url.rstrip("/")
+
+    def resolve(self, path: str) -> Path:
+        """
+        Map a storage path to a file under the root, refusing paths that escape it.
+        """
+        full_path = (self.root / path).resolve()
+        if self.root not in full_path.parents:
+            raise ValueError("Invalid storage path")
+        return full_path
+
+    async def create_upload_target(
+        self, path: str, content_type: str, max_size: int, expires_in: int = SIGNED_URL_EXPIRY_SECONDS
+    ) -> UploadTarget:
+        self.resolve(path)
+        expires_at = datetime.utcnow() + timedelta(seconds=expires_in)
+        token = jwt.encode(
+            {"purpose": self.TOKEN_PURPOSE, "path": path, "max_size": max_size, "exp": expires_at},
+            SECRET_KEY,
+            algorithm=ALGORITHM,
+        )
+        return UploadTarget(
+            f"{self.base_url}/local/upload?token={token}", "PUT", {"Content-Type": content_type}, expires_at
+        )
+
+    def verify_upload_token(self, token: str) -> Dict:
+        """
+        Decode an upload token issued by create_upload_target; raises ValueError if it is invalid or expired.
+        """
+        try:
+            claims = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        except jwt.PyJWTError as e:
+            raise ValueError(f"Invalid upload token: {e}")
+        if claims.get("purpose") != self.TOKEN_PURPOSE:
+            raise ValueError("Invalid upload token")
+        return claims
+
+    @staticmethod
+    def content_type_path(full_path: Path) -> Path:
+        # Local files keep their content type in a sidecar file
+        return full_path.with_name(full_path.name + ".content-type")
+
+    async def put(self, path: str, file: BinaryIO, content_type: str):
+        full_path = self.resolve(path)
+        await asyncio.to_thread(full_path.parent.mkdir, parents=True, exist_ok=True)
+        # Write to a temporary name and rename, so readers never see a partial file
+        temp_path = full_path.with_name(f".{full_path.name}.{uuid.uuid4().hex}.part")
+        target = await asyncio.to_thread(open, temp_path, "wb")
+        try:
+            with target:
+                while True:
+                    chunk = await asyncio.to_thread(file.read, STREAM_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    await asyncio.to_thread(target.write, chunk)
+            await asyncio.to_thread(self.content_type_path(full_path).write_text, content_type)
+            await asyncio.to_thread(os.replace, temp_path, full_path)
+        finally:
+            await asyncio.to_thread(temp_path.unlink, missing_ok=True)
+
+    async def get(self, path: str) -> bytes:
+        return await asyncio.to_thread(self.resolve(path).read_bytes)
+
+    async def stream(self, path: str, chunk_size: int = STREAM_CHUNK_SIZE) -> AsyncIterator[bytes]:
+        source = await asyncio.to_thread(open, self.resolve(path), "rb")
+        try:
+            while True:
+                chunk = await asyncio.to_thread(source.read, chunk_size)
+                if not chunk:
+                    return
+                yield chunk
+        finally:
+            source.close()
+
+    async def delete(self, path: str) -> bool:
+        full_path = self.resolve(path)
+
+        def remove() -> bool:
+            self.content_type_path(full_path).unlink(missing_ok=True)
+            try:
+                full_path.unlink()
+                return True
+            except FileNotFoundError:
+                return False
+
+        return await asyncio.to_thread(remove)
+
+    async def stat(self, path: str) -> Optional[StoredObject]:
+        full_path = self.resolve(path)
+
+        def read_stat() -> Optional[StoredObject]:
+            if not full_path.is_file():
+                return None
+            content_type_path = self.content_type_path(full_path)
+            content_type = content_type_path.read_text() if content_type_path.exists() else None
+            return StoredObject(path, full_path.stat().st_size, content_type)
+
+        return await asyncio.to_thread(read_stat)
+
+    def public_url(self, path: str) -> str:
+        return f"{self.base_url}/local/files/{path}"
+
+
+def create_storage() -> StorageBackend:
+    if STORAGE_BACKEND == "local":
+        os.makedirs(LOCAL_STORAGE_ROOT, exist_ok=True)
+        return LocalStorage(LOCAL_STORAGE_ROOT, LOCAL_STORAGE_BASE_URL)
+    if STORAGE_BACKEND == "gcs":
+        return GCSStorage(settings.GOOGLE_CLOUD_BUCKET_NAME)
+    raise ValueError(f"Unknown STORAGE_BACKEND: {STORAGE_BACKEND}")
+
+
+storage = create_storage()
@@ -0,0 +1,231 @@
+"""
+Bounded-memory handling of attachments.
+
+- UploadLimitMiddleware caps every multipart request body at MAX_UPLOAD_REQUEST_BYTES and
+  the upload bytes a worker holds at once at UPLOAD_WORKER_BUDGET_BYTES. Requests are
+  rejected as soon as either is exceeded (from Content-Length, or while the body streams),
+  not after the body has been parsed.
+- Starlette spools multipart files to disk past 1MB, so handlers pass `UploadFile.file`
+  downstream (see attachment_file) instead of reading it into bytes.
+- spool_chunks writes a chunk stream from storage or HTTP to a spooled temporary file.
+- worker_file hands a spooled file to a worker process by path rather than by value.
+"""
+import asyncio
+import mmap
+import os
+import shutil
+import tempfile
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncIterator, BinaryIO, Iterator, Optional, Union
+from fastapi import UploadFile
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse
+from app.core.config import (
+    MAX_ATTACHMENT_BYTES,
+    MAX_UPLOAD_REQUEST_BYTES,
+    UPLOAD_SPOOL_DIR,
+    UPLOAD_SPOOL_MEMORY_BYTES,
+    UPLOAD_WORKER_BUDGET_BYTES,
+)
+from app.core.exceptions import AttachmentTooLargeException
+
+
+class UploadBudget:
+    """
+    Upload bytes in flight on this worker. Only touched from the event loop, so no lock.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.in_use = 0
+        self.peak = 0
+        self.rejected = 0
+
+    def try_reserve(self, size: int) -> bool:
+        if self.in_use + size > self.limit:
+            self.rejected += 1
+            return False
+        self.in_use += size
+        self.peak = max(self.peak, self.in_use)
+        return True
+
+    def release(self, size: int):
+        self.in_use -= size
+
+    def stats(self) -> dict:
+        return {"limit_bytes": self.limit, "in_use_bytes": self.in_use, "peak_bytes": self.peak, "rejected": self.rejected}
+
+
+upload_budget = UploadBudget(UPLOAD_WORKER_BUDGET_BYTES)
+
+
+class _UploadRejected(Exception):
+    def __init__(self, response: JSONResponse):
+        self.response = response
+
+
+def _too_large() -> JSONResponse:
+    return JSONResponse({"detail": "Upload is too large"}, status_code=413)
+
+
+def _over_budget() -> JSONResponse:
+    return JSONResponse(
+        {"detail": "Too many uploads in progress, please retry shortly"}, status_code=503, headers={"Retry-After": "5"}
+    )
+
+
+class UploadLimitMiddleware:
+    """
+    ASGI middleware enforcing the per-request and per-worker upload limits on multipart requests.
+    """
+
+    def __init__(self, app, max_body_bytes: int = MAX_UPLOAD_REQUEST_BYTES, budget: UploadBudget = upload_budget):
+        self.app = app
+        self.max_body_bytes = max_body_bytes
+        self.budget = budget
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        headers = Headers(scope=scope)
+        if not headers.get("content-type", "").startswith("multipart/form-data"):
+            return await self.app(scope, receive, send)
+
+        try:
+            declared = int(headers.get("content-length", ""))
+        except ValueError:
+            declared = 0
+        if declared > self.max_body_bytes:
+            return await _too_large()(scope, receive, send)
+
+        reserved = 0
+        received = 0
+        rejection: Optional[JSONResponse] = None
+        response_started = False
+
+        def reserve(size: int):
+            nonlocal reserved, rejection
+            if size > reserved:
+                if not self.budget.try_reserve(size - reserved):
+                    rejection = _over_budget()
+                    raise _UploadRejected(rejection)
+                reserved = size
+
+        async def limited_receive():
+            nonlocal received, rejection
+            if rejection is not None:
+                return {"type": "http.disconnect"}
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_body_bytes:
+                    rejection = _too_large()
+                    raise _UploadRejected(rejection)
+                reserve(received)
+            return message
+
+        async def guarded_send(message):
+            nonlocal response_started
+            # Whatever the app makes of an aborted body is replaced by the rejection
+            if rejection is not None and not response_started:
+                return
+            response_started = True
+            await send(message)
+
+        try:
+            # Reserve the declared size up front so an over-budget request is refused before it streams
+            reserve(declared)
+            await self.app(scope, limited_receive, guarded_send)
+        except Exception:
+            if rejection is None or response_started:
+                raise
+        finally:
+            self.budget.release(reserved)
+        if rejection is not None and not response_started:
+            response_started = True
+            await rejection(scope, receive, send)
+
+
+def attachment_file(upload: Optional[UploadFile], max_bytes: int = MAX_ATTACHMENT_BYTES) -> Optional[BinaryIO]:
+    """
+    Return the spooled file behind an upload, rewound, once its size is checked against `max_bytes`.
+    """
+    if upload is None:
+        return None
+    if upload.size is not None and upload.size > max_bytes:
+        raise AttachmentTooLargeException(f"{upload.filename or 'Attachment'} is too large")
+    upload.file.seek(0)
+    return upload.file
+
+
+async def spool_chunks(chunks: AsyncIterator[bytes], max_bytes: int = MAX_ATTACHMENT_BYTES) -> BinaryIO:
+    """
+    Write a chunk stream to a temporary file (in memory until UPLOAD_SPOOL_MEMORY_BYTES) and return it rewound.
+    - Raises AttachmentTooLargeException as soon as more than `max_bytes` arrive.
+    """
+    spool = tempfile.SpooledTemporaryFile(max_size=UPLOAD_SPOOL_MEMORY_BYTES, dir=UPLOAD_SPOOL_DIR)
+    size = 0
+    try:
+        async for chunk in chunks:
+            size += len(chunk)
+            if size > max_bytes:
+                raise AttachmentTooLargeException("Attachment is too large")
+            await asyncio.to_thread(spool.write, chunk)
+        spool.seek(0)
+        return spool
+    except BaseException:
+        spool.close()
+        raise
+
+
+@contextmanager
+def mapped_file(file: BinaryIO) -> Iterator[Union[memoryview, bytes]]:
+    """
+    Expose a file's contents as a read-only buffer: a memory map when the file is on disk,
+    its bytes when it is still a small in-memory spool.
+    """
+    file.seek(0)
+    # fileno() would force an in-memory spool onto disk just to map it
+    in_memory = isinstance(file, tempfile.SpooledTemporaryFile) and not file._rolled
+    if in_memory or not hasattr(file, "fileno"):
+        yield file.read()
+        return
+    try:
+        mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    except ValueError:
+        # Empty files cannot be mapped
+        yield b""
+        return
+    view = memoryview(mapped)
+    try:
+        yield view
+    finally:
+        view.release()
+        mapped.close()
+
+
+@asynccontextmanager
+async def worker_file(file: BinaryIO) -> AsyncIterator[Union[str, bytes]]:
+    """
+    Make a file readable from another process without pickling its contents.
+    - Yields a path to open: the file's own when it has one, otherwise a named copy in
+      UPLOAD_SPOOL_DIR (spools roll over to anonymous files), removed afterwards.
+    - A spool still held in memory is small enough to pass as bytes.
+    """
+    file.seek(0)
+    if isinstance(file, tempfile.SpooledTemporaryFile) and not file._rolled:
+        yield file.read()
+        return
+    name = getattr(file, "name", None)
+    if isinstance(name, str) and os.path.isfile(name):
+        yield name
+        return
+
+    copy = tempfile.NamedTemporaryFile(dir=UPLOAD_SPOOL_DIR, delete=False)
+    try:
+        with copy:
+            await asyncio.to_thread(shutil.copyfileobj, file, copy)
+        yield copy.name
+    finally:
+        file.seek(0)
+        os.unlink(copy.name)
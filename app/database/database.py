@@ -8,6 +8,13 @@ db = client[settings.DATABASE_NAME]
 Users = db.users
 Tickets = db.tickets
 Notifications = db.notifications
+NotificationOutbox = db.notification_outbox
+NotificationCounters = db.notification_counters
+NotificationArchive = db.notification_archive
+NotificationRollups = db.notification_rollups
+JobLocks = db.job_locks
 Chats = db.chats
+ChatMessages = db.chat_messages
 Feedback = db.feedback
-Reports = db.reports
\ No newline at end of file
+Reports = db.reports
+StoredFiles = db.stored_files
\ No newline at end of file
@@ -0,0 +1,211 @@
+"""
+Versioned index specification for the application's collections.
+
+Applied idempotently on startup (see the lifespan hook in app/main.py) and
+runnable on its own:
+
+    python -m app.database.indexes           # apply the spec and report drift
+    python -m app.database.indexes --check   # only report drift, exit 1 if any
+"""
+import asyncio
+import sys
+from datetime import datetime
+from typing import Dict, List
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from app.core.config import NOTIFICATION_RETENTION_DAYS, OUTBOX_RETENTION_DAYS
+from app.database.database import db
+
+# Bump whenever INDEX_SPEC changes so the applied version is visible in the migrations collection.
+INDEX_SPEC_VERSION = 10
+
+INDEX_SPEC: Dict[str, List[IndexModel]] = {
+    "users": [
+        IndexModel([("email", ASCENDING)], name="email_1"),
+        IndexModel([("role", ASCENDING), ("status", ASCENDING)], name="role_1_status_1"),
+        IndexModel([("status", ASCENDING)], name="status_1"),
+    ],
+    "tickets": [
+        # Compound with _id so paginated listings walk the index in order instead of sorting in memory
+        IndexModel([("patient_id", ASCENDING), ("_id", DESCENDING)], name="patient_id_1__id_-1"),
+        IndexModel([("assigned_doctor_id", ASCENDING), ("_id", DESCENDING)], name="assigned_doctor_id_1__id_-1"),
+        IndexModel([("status", ASCENDING), ("_id", DESCENDING)], name="status_1__id_-1"),
+        # Role listings filtered by status
+        IndexModel(
+            [("patient_id", ASCENDING), ("status", ASCENDING), ("_id", DESCENDING)],
+            name="patient_id_1_status_1__id_-1",
+        ),
+        IndexModel(
+            [("assigned_doctor_id", ASCENDING), ("status", ASCENDING), ("_id", DESCENDING)],
+            name="assigned_doctor_id_1_status_1__id_-1",
+        ),
+    ],
+    "chats": [
+        IndexModel([("session_id", ASCENDING)], name="session_id_1", unique=True),
+        # Session lists, newest first, with and without a ticket filter
+        IndexModel([("user_id", ASCENDING), ("_id", DESCENDING)], name="user_id_1__id_-1"),
+        IndexModel(
+            [("user_id", ASCENDING), ("ticket_id", ASCENDING), ("_id", DESCENDING)],
+            name="user_id_1_ticket_id_1__id_-1",
+        ),
+    ],
+    "chat_messages": [
+        IndexModel([("session_id", ASCENDING), ("bucket", DESCENDING)], name="session_id_1_bucket_-1", unique=True),
+    ],
+    "notifications": [
+        # Inbox pages, newest first, with and without the unread filter
+        IndexModel([("user_id", ASCENDING), ("_id", DESCENDING)], name="user_id_1__id_-1"),
+        IndexModel(
+            [("user_id", ASCENDING), ("read", ASCENDING), ("_id", DESCENDING)],
+            name="user_id_1_read_1__id_-1",
+        ),
+        # Retention: only read notifications carry read_at, so unread ones never expire
+        IndexModel(
+            [("read_at", ASCENDING)],
+            name="read_at_1",
+            expireAfterSeconds=NOTIFICATION_RETENTION_DAYS * 24 * 3600,
+        ),
+    ],
+    "notification_rollups": [
+        IndexModel([("user_id", ASCENDING), ("month", DESCENDING)], name="user_id_1_month_-1", unique=True),
+    ],
+    "notification_archive": [
+        IndexModel([("user_id", ASCENDING), ("_id", DESCENDING)], name="user_id_1__id_-1"),
+    ],
+    "notification_outbox": [
+        # Claim queries: due pending entries and expired leases
+        IndexModel([("status", ASCENDING), ("next_attempt_at", ASCENDING)], name="status_1_next_attempt_at_1"),
+        IndexModel([("status", ASCENDING), ("claimed_at", ASCENDING)], name="status_1_claimed_at_1"),
+        # At most one digest per (recipient, type) collecting events at a time
+        IndexModel(
+            [("digest_key", ASCENDING)],
+            name="digest_key_1",
+            unique=True,
+            partialFilterExpression={"digest_open": True},
+        ),
+        # Delivered entries are only kept for a while; failed ones stay for inspection
+        IndexModel(
+            [("delivered_at", ASCENDING)],
+            name="delivered_at_1",
+            expireAfterSeconds=OUTBOX_RETENTION_DAYS * 24 * 3600,
+        ),
+    ],
+    "reports": [
+        IndexModel([("ticket_id", ASCENDING)], name="ticket_id_1"),
+    ],
+    "stored_files": [
+        # Releasing and cache lookups go from an attachment URL's path to its record
+        IndexModel([("path", ASCENDING)], name="path_1", unique=True),
+    ],
+}
+
+# Indexes from earlier spec versions that have been superseded and are safe to drop.
+RETIRED_INDEXES: Dict[str, List[str]] = {
+    "tickets": ["patient_id_1", "assigned_doctor_id_1", "status_1"],  # v2: compound with _id
+    "chats": ["user_id_1_ticket_id_1"],  # v4: compound with _id
+    "notifications": ["user_id_1_read_1"],  # v8: compound with _id
+}
+
+MIGRATIONS_COLLECTION = "migrations"
+
+# Index options that are compared when looking for drift.
+_COMPARED_OPTIONS = ("unique", "sparse", "expireAfterSeconds", "partialFilterExpression")
+
+
+def _normalize(index: dict) -> dict:
+    """
+    Reduce an index description to the parts that matter for drift detection.
+    """
+    key = index["key"]
+    pairs = key.items() if hasattr(key, "items") else key
+    return {
+        "key": [(field, int(direction) if isinstance(direction, float) else direction) for field, direction in pairs],
+        **{option: index[option] for option in _COMPARED_OPTIONS if option in index},
+    }
+
+
+async def index_drift(db: AsyncIOMotorDatabase) -> Dict[str, Dict[str, List[str]]]:
+    """
+    Compare the live indexes against INDEX_SPEC.
+    - missing: in the spec but not on the collection.
+    - changed: present under the same name with different keys or options.
+    - extra: on the collection but not in the spec (never dropped automatically).
+    """
+    drift = {}
+    for collection_name, models in INDEX_SPEC.items():
+        live = await db[collection_name].index_information()
+        live.pop("_id_", None)
+        expected = {model.document["name"]: model.document for model in models}
+
+        missing = [name for name in expected if name not in live]
+        changed = [
+            name for name in expected
+            if name in live and _normalize(expected[name]) != _normalize(live[name])
+        ]
+        extra = [name for name in live if name not in expected]
+        if missing or changed or extra:
+            drift[collection_name] = {"missing": missing, "changed": changed, "extra": extra}
+    return drift
+
+
+async def ensure_indexes(db: AsyncIOMotorDatabase) -> Dict[str, Dict[str, List[str]]]:
+    """
+    Create every index in INDEX_SPEC (a no-op for indexes that already exist),
+    drop retired indexes, record the applied spec version and return any remaining drift.
+    - Indexes are created one at a time; one that conflicts with the live collection (an
+      index of the same name with other options, or data violating a unique index) is
+      reported as "changed" drift and the rest are still applied.
+    - The spec version is only recorded once every index was created.
+    """
+    failed: Dict[str, List[str]] = {}
+    for collection_name, models in INDEX_SPEC.items():
+        for model in models:
+            name = model.document["name"]
+            try:
+                await db[collection_name].create_indexes([model])
+            except OperationFailure as e:
+                print(f"Failed to create index {collection_name}.{name}: {e}")
+                failed.setdefault(collection_name, []).append(name)
+
+    for collection_name, names in RETIRED_INDEXES.items():
+        live = await db[collection_name].index_information()
+        for name in names:
+            if name in live:
+                await db[collection_name].drop_index(name)
+
+    if not failed:
+        await db[MIGRATIONS_COLLECTION].update_one(
+            {"_id": "indexes"},
+            {"$set": {"version": INDEX_SPEC_VERSION, "applied_at": datetime.utcnow()}},
+            upsert=True,
+        )
+    drift = await index_drift(db)
+    for collection_name, names in failed.items():
+        report = drift.setdefault(collection_name, {"missing": [], "changed": [], "extra": []})
+        report["missing"] = [name for name in report["missing"] if name not in names]
+        report["changed"] += [name for name in names if name not in report["changed"]]
+    return drift
+
+
+def _print_drift(drift: Dict[str, Dict[str, List[str]]]):
+    if not drift:
+        print(f"Indexes match spec version {INDEX_SPEC_VERSION}.")
+        return
+    for collection_name, report in drift.items():
+        for kind, names in report.items():
+            if names:
+                print(f"{collection_name}: {kind}: {', '.join(names)}")
+
+
+async def _main(argv: List[str]) -> int:
+    if "--check" in argv:
+        drift = await index_drift(db)
+    else:
+        drift = await ensure_indexes(db)
+    _print_drift(drift)
+    return 1 if "--check" in argv and drift else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(_main(sys.argv[1:])))
@@ -3,6 +3,7 @@ from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 from app.schemas.token_schemas import TokenData
 from app.core.config import SECRET_KEY, ALGORITHM
+from app.core.cache import user_cache
 from app.services.user_service import UserService
 from app.dependencies.service_dependencies import get_user_service
 
@@ -28,8 +29,11 @@ async def get_current_user(
     except JWTError:
         raise credentials_exception
 
-    # Fetch user by user_id
-    user = await user_service.get_user_by_id(user_id)
+    # Fetch user by user_id, serving repeat requests from the in-process cache
+    user = user_cache.get(user_id)
+    if user is None:
+        user = await user_service.get_user_by_id(user_id)
+        user_cache.set(user_id, user)
     if user is None or user['status'] != 'accepted':
         raise credentials_exception
     return user
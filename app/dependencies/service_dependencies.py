@@ -13,7 +13,10 @@ from app.repositories.ticket_repository import TicketRepository
 from app.repositories.chat_repository import ChatRepository
 from app.repositories.feedback_repository import FeedbackRepository  # Import FeedbackRepository
 from app.repositories.notification_repository import NotificationRepository
-from app.database.database import Users, Tickets, Notifications, Feedback, Reports  # Add Feedback collection
+from app.repositories.outbox_repository import OutboxRepository
+from app.core.storage import StorageBackend, storage
+from app.services.file_store import FileStore, file_store
+from app.database.database import Users, Tickets, Notifications, NotificationCounters, NotificationOutbox, Feedback, Reports  # Add Feedback collection
 
 # Repository dependencies
 def get_user_repository():
@@ -23,7 +26,10 @@ def get_ticket_repository():
     return TicketRepository(collection=Tickets)
 
 def get_notification_repository():
-    return NotificationRepository(collection=Notifications)
+    return NotificationRepository(collection=Notifications, counter_collection=NotificationCounters)
+
+def get_outbox_repository():
+    return OutboxRepository(collection=NotificationOutbox)
 
 def get_chat_repository():
     return ChatRepository()
@@ -38,8 +44,9 @@ def get_report_repository():
 
 def get_notification_service(
     notification_repository: NotificationRepository = Depends(get_notification_repository),
+    outbox_repository: OutboxRepository = Depends(get_outbox_repository),
 ):
-    return NotificationService(notification_repository)
+    return NotificationService(notification_repository, outbox_repository)
 
 def get_user_service(
     user_repository: UserRepository = Depends(get_user_repository),
@@ -58,15 +65,25 @@ def get_admin_service(
 ):
     return AdminService(user_repository, notification_service)
 
+def get_storage():
+    return storage
+
+def get_file_store():
+    return file_store
+
 def get_ticket_service(
     ticket_repository: TicketRepository = Depends(get_ticket_repository),
     notification_service: NotificationService = Depends(get_notification_service),
-    user_repository: UserRepository = Depends(get_user_repository)
+    user_repository: UserRepository = Depends(get_user_repository),
+    storage: StorageBackend = Depends(get_storage),
+    file_store: FileStore = Depends(get_file_store),
 ):
     return TicketService(
         ticket_repository=ticket_repository,
         user_repository=user_repository,
-        notification_service=notification_service
+        notification_service=notification_service,
+        storage=storage,
+        file_store=file_store,
     )
 
 def get_chat_service(
@@ -1,6 +1,17 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from app.core.config import ENSURE_INDEXES_ON_STARTUP
 from app.core.firebase import initialize_firebase
+from app.core.google_cloud import get_gcs_client
+from app.core.images import shutdown_image_pool
+from app.core.notification_hub import notification_hub
+from app.core.push_dispatcher import push_dispatcher
+from app.core.uploads import UploadLimitMiddleware
+from app.database.database import db
+from app.database.indexes import ensure_indexes
+from app.services.notification_compactor import notification_compactor
+from app.services.outbox_worker import outbox_worker
 from app.routers.auth_router import auth_router
 from app.routers.user_router import user_router
 from app.routers.admin_router import admin_router
@@ -9,12 +20,44 @@ from app.routers.notification_router import notification_router
 from app.routers.chat_router import chat_router
 from app.routers.feedback_router import feedback_router
 from app.routers.misc_router import misc_router
+from app.routers.storage_router import storage_router
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Make sure every index in the spec exists before serving traffic
+    if ENSURE_INDEXES_ON_STARTUP:
+        try:
+            drift = await ensure_indexes(db)
+            if drift:
+                print(f"Index drift detected: {drift}")
+        except Exception as e:
+            print(f"Failed to apply index spec: {e}")
+    # Build the shared GCS client up front so the first upload does not pay for it
+    try:
+        get_gcs_client()
+    except Exception as e:
+        print(f"Failed to initialize GCS client: {e}")
+    push_dispatcher.start()
+    outbox_worker.start()
+    notification_compactor.start()
+    yield
+    # Release any notification streams still open
+    notification_hub.close_all()
+    await notification_compactor.stop()
+    # Finish in-flight deliveries, then flush pushes that are still queued
+    await outbox_worker.stop()
+    await push_dispatcher.stop()
+    shutdown_image_pool()
+
+app = FastAPI(lifespan=lifespan)
 
 # Initialize Firebase
 initialize_firebase() 
 
+# Reject oversized uploads, and uploads beyond this worker's byte budget, while they stream in
+# (added before CORS so rejections still carry CORS headers)
+app.add_middleware(UploadLimitMiddleware)
+
 # Add CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -22,6 +65,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],  # Allows all methods
     allow_headers=["*"],  # Allows all headers
+    expose_headers=["X-Next-Cursor"],  # Lets browser clients read pagination cursors
 )
 
 # Include the auth router
@@ -33,6 +77,7 @@ app.include_router(notification_router, prefix='/api')
 app.include_router(chat_router, prefix='/api')
 app.include_router(feedback_router, prefix='/api')
 app.include_router(misc_router, prefix='/api')
+app.include_router(storage_router, prefix='/api')
 
 @app.get("/")
 async def root():
@@ -1,38 +1,298 @@
-from typing import List, Optional
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
 from motor.motor_asyncio import AsyncIOMotorCollection
-from app.database.database import Chats
-from app.schemas.chat_schemas import ChatSession, ChatResponse, ChatList, ChatView
+from pymongo.errors import DuplicateKeyError
+from app.core.config import CHAT_BUCKET_SIZE, CHAT_CONTEXT_BUCKETS
+from app.core.exceptions import ChatSessionConflictException
+from app.database.database import Chats, ChatMessages
+from app.schemas.chat_schemas import ChatMessage, ChatSession, ChatResponse, ChatList, ChatView
+from app.utils.pagination import DEFAULT_PAGE_SIZE, fetch_page
+
+LAST_MESSAGE_PREVIEW_LENGTH = 120
+# History entries of the opening turn, which carries the patient and ticket context
+OPENING_HISTORY_ENTRIES = 2
+
+# Sessions created before messages were bucketed still embed `messages` and `chat_history`
+# in the session document; their counts and previews fall back to those arrays.
+CHAT_LIST_PROJECTION = {
+    "session_id": 1,
+    "user_id": 1,
+    "ticket_id": 1,
+    "created_at": 1,
+    "updated_at": 1,
+    "message_count": {
+        "$add": [{"$ifNull": ["$message_count", 0]}, {"$size": {"$ifNull": ["$messages", []]}}]
+    },
+    "last_message": {
+        "$substrCP": [
+            {"$ifNull": ["$last_message", {"$ifNull": [{"$arrayElemAt": ["$messages.text", -1]}, ""]}]},
+            0,
+            LAST_MESSAGE_PREVIEW_LENGTH,
+        ]
+    },
+    "last_message_at": {"$ifNull": ["$last_message_at", {"$arrayElemAt": ["$messages.timestamp", -1]}]},
+}
 
 class ChatRepository:
-    def __init__(self, collection: AsyncIOMotorCollection = Chats):
+    """
+    Chat sessions are stored as a metadata document in `chats` plus fixed-size
+    bucket documents in `chat_messages`, each holding up to CHAT_BUCKET_SIZE
+    messages and the Gemini history entries of the same turns. Session
+    documents therefore stay small however long a conversation runs.
+    - The session tracks the bucket being filled (`bucket`, `bucket_count`); a turn that
+      does not fit starts the next bucket.
+    - A turn is written to the session as `pending_turn` before it is copied into its
+      bucket (tagged in the bucket's `turns`), so a turn interrupted between the two
+      writes is finished by the next read or write of the session instead of being lost.
+    """
+
+    def __init__(
+        self,
+        collection: AsyncIOMotorCollection = Chats,
+        message_collection: AsyncIOMotorCollection = ChatMessages,
+    ):
         self.collection = collection
+        self.message_collection = message_collection
 
     async def save_chat_session(self, chat_session: ChatSession):
-        await self.collection.insert_one(chat_session.dict())
+        """
+        Store a new session: its metadata document and the first message bucket.
+        """
+        session_data = chat_session.dict(exclude={"messages", "chat_history"})
+        messages = [message.dict() for message in chat_session.messages]
+        session_data.update(self._message_summary(messages))
+        session_data.update({"bucket": 0, "bucket_count": len(messages)})
+        await self.collection.insert_one(session_data)
+        if messages or chat_session.chat_history:
+            await self._push_to_bucket(
+                chat_session.session_id, 0, chat_session.turn, messages, chat_session.chat_history, chat_session.updated_at
+            )
 
     async def get_chat_session(self, session_id: str) -> Optional[ChatResponse]:
+        """
+        Load a session with its full conversation, reassembled from its buckets in order.
+        """
+        session_data = await self.collection.find_one({"session_id": session_id})
+        if not session_data:
+            return None
+        await self._finish_pending_turn(session_id, session_data)
+
+        messages = session_data.pop("messages", [])
+        chat_history = session_data.pop("chat_history", [])
+        buckets = self.message_collection.find(
+            {"session_id": session_id}, {"messages": 1, "chat_history": 1}
+        ).sort("bucket", 1)
+        async for bucket in buckets:
+            messages.extend(bucket.get("messages", []))
+            chat_history.extend(bucket.get("chat_history", []))
+        return ChatResponse(**session_data, messages=messages, chat_history=chat_history)
+
+    async def get_chat_context(self, session_id: str) -> Optional[ChatResponse]:
+        """
+        Load a session with only what the next turn needs: the messages and history of its
+        newest CHAT_CONTEXT_BUCKETS buckets, preceded by the opening turn's history.
+        - Reads a bounded number of buckets however long the session is; older messages are
+          available through get_message_page.
+        """
         session_data = await self.collection.find_one({"session_id": session_id})
-        return ChatResponse(**session_data) if session_data else None
+        if not session_data:
+            return None
+        if session_data.get("messages") or session_data.get("chat_history"):
+            # Sessions stored before bucketing are read whole
+            return await self.get_chat_session(session_id)
+        await self._finish_pending_turn(session_id, session_data)
+
+        buckets = await self.message_collection.find(
+            {"session_id": session_id}, {"messages": 1, "chat_history": 1, "bucket": 1}
+        ).sort("bucket", -1).limit(CHAT_CONTEXT_BUCKETS).to_list(length=CHAT_CONTEXT_BUCKETS)
+        buckets.reverse()
+        messages, chat_history = [], []
+        for bucket in buckets:
+            messages.extend(bucket.get("messages", []))
+            chat_history.extend(bucket.get("chat_history", []))
+        if buckets and buckets[0]["bucket"] > 0:
+            opening = await self.message_collection.find_one(
+                {"session_id": session_id, "bucket": 0}, {"chat_history": {"$slice": OPENING_HISTORY_ENTRIES}}
+            )
+            if opening:
+                chat_history = opening.get("chat_history", []) + chat_history
+        return ChatResponse(**session_data, messages=messages, chat_history=chat_history)
+
+    async def get_message_page(
+        self, session_id: str, before: Optional[int] = None
+    ) -> Optional[Tuple[List[ChatMessage], Optional[int]]]:
+        """
+        Read one bucket of messages, paging backwards from the newest.
+        - `before` is the bucket number returned by the previous page; omit it for the newest bucket.
+        - Returns the messages (oldest first within the page) and the `before` value for the
+          next older page, or None when this was the oldest page. Returns None if the session
+          does not exist.
+        """
+        session_data = await self.collection.find_one({"session_id": session_id}, {"messages": {"$slice": 1}})
+        if not session_data:
+            return None
+        await self._finish_pending_turn(session_id, session_data)
+        has_legacy_messages = bool(session_data.get("messages"))
+
+        query = {"session_id": session_id}
+        if before is not None:
+            query["bucket"] = {"$lt": before}
+        bucket = await self.message_collection.find_one(
+            query, {"messages": 1, "bucket": 1}, sort=[("bucket", -1)]
+        )
+        if bucket:
+            if bucket["bucket"] > 0:
+                next_before = bucket["bucket"]
+            else:
+                next_before = 0 if has_legacy_messages else None
+            return [ChatMessage(**message) for message in bucket.get("messages", [])], next_before
 
-    async def update_chat_session(self, chat_session: ChatSession):
+        # Messages embedded in a pre-bucketing session document form the oldest page
+        if has_legacy_messages:
+            legacy = await self.collection.find_one({"session_id": session_id}, {"messages": 1})
+            return [ChatMessage(**message) for message in legacy.get("messages", [])], None
+        return [], None
+
+    async def append_chat_turn(
+        self,
+        session_id: str,
+        expected_turn: int,
+        messages: List[ChatMessage],
+        history_entries: List[Dict[str, str]],
+        updated_at: datetime,
+    ):
+        """
+        Persist one chat turn by appending only its new messages and history entries.
+        - The session document is claimed first, recording the turn as `pending_turn`: the
+          write only applies if the session is still at `expected_turn`, so two concurrent
+          turns cannot overwrite each other; the loser gets ChatSessionConflictException.
+        - The pending turn is then copied into its bucket and cleared.
+        """
+        message_dicts = [message.dict() for message in messages]
+        session_data = await self.collection.find_one(
+            {"session_id": session_id}, {"message_count": 1, "bucket": 1, "bucket_count": 1, "pending_turn": 1}
+        )
+        if session_data is None:
+            raise ChatSessionConflictException("Chat session was updated by another request, please retry")
+        # A turn interrupted before reaching its bucket is finished before the next one lands
+        await self._finish_pending_turn(session_id, session_data)
+
+        if "bucket" in session_data:
+            bucket, bucket_count = session_data["bucket"], session_data.get("bucket_count", 0)
+        else:
+            # Sessions bucketed before the current bucket was tracked
+            bucket, bucket_count = divmod(session_data.get("message_count", 0), CHAT_BUCKET_SIZE)
+        if bucket_count and bucket_count + len(message_dicts) > CHAT_BUCKET_SIZE:
+            bucket, bucket_count = bucket + 1, 0
+
+        pending_turn = {
+            "turn": expected_turn + 1,
+            "bucket": bucket,
+            "messages": message_dicts,
+            "chat_history": history_entries,
+            "updated_at": updated_at,
+        }
+        # Sessions saved before turns were tracked have no `turn` field; None matches a missing field
+        turn_filter = {"$in": [0, None]} if expected_turn == 0 else expected_turn
+        result = await self.collection.update_one(
+            {"session_id": session_id, "turn": turn_filter},
+            {
+                "$set": {
+                    "updated_at": updated_at,
+                    "turn": expected_turn + 1,
+                    "bucket": bucket,
+                    "bucket_count": bucket_count + len(message_dicts),
+                    "pending_turn": pending_turn,
+                    **self._last_message(message_dicts),
+                },
+                "$inc": {"message_count": len(message_dicts)},
+            },
+        )
+        if not result.matched_count:
+            raise ChatSessionConflictException("Chat session was updated by another request, please retry")
+        await self._finish_pending_turn(session_id, {"pending_turn": pending_turn})
+
+    async def _finish_pending_turn(self, session_id: str, session_data: Dict):
+        """
+        Copy the session's pending turn into its bucket (at most once) and clear it.
+        """
+        pending_turn = session_data.pop("pending_turn", None)
+        if not pending_turn:
+            return
+        try:
+            await self._push_to_bucket(
+                session_id,
+                pending_turn["bucket"],
+                pending_turn["turn"],
+                pending_turn["messages"],
+                pending_turn["chat_history"],
+                pending_turn["updated_at"],
+            )
+        except DuplicateKeyError:
+            # The bucket already holds this turn
+            pass
         await self.collection.update_one(
-            {"session_id": chat_session.session_id},
-            {"$set": chat_session.dict()},
+            {"session_id": session_id, "pending_turn.turn": pending_turn["turn"]}, {"$unset": {"pending_turn": ""}}
         )
 
     async def delete_chat_session(self, session_id: str):
         await self.collection.delete_one({"session_id": session_id})
+        await self.message_collection.delete_many({"session_id": session_id})
 
 
     async def get_chats_by_user_and_ticket(
-        self, user_id: str, ticket_id: Optional[str] = None
-    ) -> List[ChatList]:
+        self,
+        user_id: str,
+        ticket_id: Optional[str] = None,
+        limit: int = DEFAULT_PAGE_SIZE,
+        cursor: Optional[str] = None,
+    ) -> Tuple[List[ChatList], Optional[str]]:
+        """
+        List a user's chat sessions, newest first, without loading their messages.
+        - The message count and last-message preview come from the session metadata.
+        - Returns the sessions and the cursor for the next page.
+        """
         query = {"user_id": user_id}
         if ticket_id:
             query["ticket_id"] = ticket_id
 
-        cursor = self.collection.find(query)
-        chat_list = []
-        async for chat_data in cursor:
-            chat_list.append(ChatList(**chat_data))
-        return chat_list
\ No newline at end of file
+        chats, next_cursor = await fetch_page(self.collection, query, limit, cursor, projection=CHAT_LIST_PROJECTION)
+        return [ChatList(**chat_data) for chat_data in chats], next_cursor
+
+    async def _push_to_bucket(
+        self,
+        session_id: str,
+        bucket: int,
+        turn: int,
+        messages: List[Dict],
+        history_entries: List[Dict[str, str]],
+        updated_at: datetime,
+    ):
+        # A bucket that already holds the turn does not match; the upsert then fails on the unique index
+        await self.message_collection.update_one(
+            {"session_id": session_id, "bucket": bucket, "turns": {"$ne": turn}},
+            {
+                "$push": {
+                    "messages": {"$each": messages},
+                    "chat_history": {"$each": history_entries},
+                    "turns": turn,
+                },
+                "$inc": {"count": len(messages)},
+                "$set": {"updated_at": updated_at},
+                "$setOnInsert": {"created_at": updated_at},
+            },
+            upsert=True,
+        )
+
+    @staticmethod
+    def _last_message(messages: List[Dict]) -> Dict:
+        if not messages:
+            return {}
+        return {
+            "last_message": messages[-1]["text"][:LAST_MESSAGE_PREVIEW_LENGTH],
+            "last_message_at": messages[-1]["timestamp"],
+        }
+
+    @classmethod
+    def _message_summary(cls, messages: List[Dict]) -> Dict:
+        return {"message_count": len(messages), **cls._last_message(messages)}
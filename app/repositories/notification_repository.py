@@ -1,20 +1,129 @@
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
 from bson import ObjectId
 from motor.motor_asyncio import AsyncIOMotorCollection
-from app.database.database import Notifications
+from pymongo.errors import DuplicateKeyError
+from app.core.config import NOTIFICATION_UNREAD_RESEED_SECONDS
+from app.database.database import Notifications, NotificationCounters
+from app.utils.pagination import DEFAULT_PAGE_SIZE, fetch_page
 
 class NotificationRepository:
-    def __init__(self, collection: AsyncIOMotorCollection = Notifications):
+    """
+    Notifications plus a per-user unread counter in `notification_counters`
+    ({_id: user_id, unread: n, seeded_at}), kept in step by every write that creates or
+    reads notifications so the unread badge never has to count the collection.
+    - The counter is approximate: a notification write and its counter update are separate
+      writes, so one landing while the counter is (re)seeded can be counted twice or not at
+      all. get_unread_count therefore recounts it every NOTIFICATION_UNREAD_RESEED_SECONDS.
+    - Marking a notification read stamps `read_at`, which the retention TTL index expires on.
+    """
+
+    def __init__(
+        self,
+        collection: AsyncIOMotorCollection = Notifications,
+        counter_collection: AsyncIOMotorCollection = NotificationCounters,
+    ):
         self.collection = collection
+        self.counter_collection = counter_collection
 
     async def create_notification(self, notification_data: dict):
         await self.collection.insert_one(notification_data)
+        if not notification_data.get("read"):
+            await self._add_unread(notification_data["user_id"], 1)
+
+    async def create_notification_once(self, notification_data: dict):
+        """
+        Insert a notification whose _id is fixed by the caller; a retry of the same insert is a no-op.
+        - Returns False when the notification already existed.
+        """
+        try:
+            await self.collection.insert_one(notification_data)
+        except DuplicateKeyError:
+            return False
+        if not notification_data.get("read"):
+            await self._add_unread(notification_data["user_id"], 1)
+        return True
+
+    async def create_notifications(self, notifications: list):
+        if notifications:
+            await self.collection.insert_many(notifications, ordered=False)
+            unread: Dict[ObjectId, int] = {}
+            for notification in notifications:
+                if not notification.get("read"):
+                    unread[notification["user_id"]] = unread.get(notification["user_id"], 0) + 1
+            for user_id, count in unread.items():
+                await self._add_unread(user_id, count)
+
+    async def get_notifications_by_user(
+        self,
+        user_id: str,
+        unread_only: bool = False,
+        limit: int = DEFAULT_PAGE_SIZE,
+        cursor: Optional[str] = None,
+    ) -> Tuple[List[Dict], Optional[str]]:
+        """
+        List a user's notifications, newest first, one page at a time.
+        - Returns the notifications and the cursor for the next page.
+        """
+        query = {"user_id": ObjectId(user_id)}
+        if unread_only:
+            query["read"] = False
+        return await fetch_page(self.collection, query, limit, cursor)
 
-    async def get_notifications_by_user(self, user_id: str):
-        # Filter notifications by user_id and read status
-        return await self.collection.find({"user_id": ObjectId(user_id), "read": False}).to_list(length=None)
+    async def get_unread_count(self, user_id: str) -> int:
+        """
+        Read the user's unread counter.
+        - A counter that was never seeded, was seeded over NOTIFICATION_UNREAD_RESEED_SECONDS
+          ago, or has drifted negative is replaced by a fresh count.
+        """
+        counter = await self.counter_collection.find_one({"_id": ObjectId(user_id)})
+        now = datetime.utcnow()
+        seeded_at = counter.get("seeded_at") if counter else None
+        if (
+            seeded_at is not None
+            and seeded_at > now - timedelta(seconds=NOTIFICATION_UNREAD_RESEED_SECONDS)
+            and counter.get("unread", 0) >= 0
+        ):
+            return counter["unread"]
+
+        unread = await self.collection.count_documents({"user_id": ObjectId(user_id), "read": False})
+        try:
+            # Conditional on the seed that was read, so concurrent recounts apply only once
+            await self.counter_collection.update_one(
+                {"_id": ObjectId(user_id), "seeded_at": seeded_at},
+                {"$set": {"unread": unread, "seeded_at": now}},
+                upsert=True,
+            )
+        except DuplicateKeyError:
+            # Another request recounted it first
+            pass
+        return unread
+
+    async def mark_as_read(self, user_id: str, notification_id: str) -> Optional[bool]:
+        """
+        Mark one of the user's notifications as read.
+        - Returns True if it was unread, False if it was already read, None if the user has no such notification.
+        """
+        query = {"_id": ObjectId(notification_id), "user_id": ObjectId(user_id)}
+        result = await self.collection.update_one(
+            {**query, "read": False}, {"$set": {"read": True, "read_at": datetime.utcnow()}}
+        )
+        if result.modified_count:
+            await self._add_unread(user_id, -1)
+            return True
+        return False if await self.collection.count_documents(query, limit=1) else None
 
     async def mark_all_as_read(self, user_id: str):
-        await self.collection.update_many(
+        result = await self.collection.update_many(
             {"user_id": ObjectId(user_id), "read": False},
-            {"$set": {"read": True}}
-        )
\ No newline at end of file
+            {"$set": {"read": True, "read_at": datetime.utcnow()}}
+        )
+        if result.modified_count:
+            await self._add_unread(user_id, -result.modified_count)
+
+    async def _add_unread(self, user_id, delta: int):
+        await self.counter_collection.update_one(
+            {"_id": ObjectId(user_id)},
+            {"$inc": {"unread": delta}},
+            upsert=True,
+        )
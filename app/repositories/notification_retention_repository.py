@@ -0,0 +1,131 @@
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo import ASCENDING, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from app.database.database import JobLocks, NotificationArchive, NotificationRollups, Notifications
+
+class NotificationRetentionRepository:
+    """
+    Storage used when compacting old read notifications:
+    - `notification_rollups`: one summary per user and month ({user_id, month, count, by_type}),
+      with the ids of the compaction batches already added (`batches`).
+    - `notification_archive`: optional verbatim copies of compacted notifications.
+    - `job_locks`: leases that keep the job to one process at a time.
+    """
+
+    def __init__(
+        self,
+        collection: AsyncIOMotorCollection = Notifications,
+        rollup_collection: AsyncIOMotorCollection = NotificationRollups,
+        archive_collection: AsyncIOMotorCollection = NotificationArchive,
+        lock_collection: AsyncIOMotorCollection = JobLocks,
+    ):
+        self.collection = collection
+        self.rollup_collection = rollup_collection
+        self.archive_collection = archive_collection
+        self.lock_collection = lock_collection
+
+    async def find_compactable(self, created_before: datetime, after_id: Optional[ObjectId], limit: int) -> List[Dict]:
+        """
+        Read notifications created before `created_before` that have been read, oldest first,
+        continuing after `after_id`.
+        """
+        id_range = {"$lt": ObjectId.from_datetime(created_before)}
+        if after_id is not None:
+            id_range["$gt"] = after_id
+        return await (
+            self.collection.find({"_id": id_range, "read": True}).sort("_id", ASCENDING).limit(limit).to_list(length=limit)
+        )
+
+    async def claim_batch(self, notification_ids: List[ObjectId], batch_id: str) -> List[Dict]:
+        """
+        Stamp the notifications not yet in a compaction batch with `batch_id`, and read them
+        back; ones stamped by an interrupted earlier run keep their original batch id.
+        """
+        await self.collection.update_many(
+            {"_id": {"$in": notification_ids}, "compaction_batch": {"$exists": False}},
+            {"$set": {"compaction_batch": batch_id}},
+        )
+        return await self.collection.find({"_id": {"$in": notification_ids}, "read": True}).to_list(length=None)
+
+    async def add_to_rollups(self, rollups: Dict[tuple, Dict[str, int]], batch_id: str):
+        """
+        Add per-type counts to the monthly summaries, keyed by (user_id, "YYYY-MM").
+        A summary that already has `batch_id` is skipped, so re-running a batch adds it once.
+        """
+        operations = [
+            UpdateOne(
+                {"user_id": user_id, "month": month, "batches": {"$ne": batch_id}},
+                {
+                    "$inc": {"count": sum(by_type.values()), **{f"by_type.{type}": n for type, n in by_type.items()}},
+                    "$push": {"batches": batch_id},
+                },
+                upsert=True,
+            )
+            for (user_id, month), by_type in rollups.items()
+        ]
+        if not operations:
+            return
+        try:
+            await self.rollup_collection.bulk_write(operations, ordered=False)
+        except BulkWriteError as e:
+            # The upsert of a summary that already has this batch hits the unique index
+            if any(error["code"] != 11000 for error in e.details["writeErrors"]):
+                raise
+
+    async def archive(self, notifications: List[Dict], archived_at: datetime):
+        """
+        Copy notifications to the archive; copies left by an interrupted earlier run are skipped.
+        """
+        if not notifications:
+            return
+        try:
+            await self.archive_collection.insert_many(
+                [{**notification, "archived_at": archived_at} for notification in notifications], ordered=False
+            )
+        except BulkWriteError as e:
+            if any(error["code"] != 11000 for error in e.details["writeErrors"]):
+                raise
+
+    async def delete(self, notification_ids: List[ObjectId]) -> List[ObjectId]:
+        """
+        Delete the notifications and return the ids that are gone.
+        """
+        await self.collection.delete_many({"_id": {"$in": notification_ids}})
+        remaining = set(await self.collection.distinct("_id", {"_id": {"$in": notification_ids}}))
+        return [notification_id for notification_id in notification_ids if notification_id not in remaining]
+
+    async def get_rollups_by_user(self, user_id: str) -> List[Dict]:
+        return await self.rollup_collection.find({"user_id": ObjectId(user_id)}).sort("month", -1).to_list(length=None)
+
+    async def collection_stats(self) -> Dict:
+        """
+        Document count and sizes of the notifications collection, as reported by collStats.
+        """
+        stats = await self.collection.database.command("collStats", self.collection.name)
+        return {
+            "count": stats.get("count", 0),
+            "size_bytes": stats.get("size", 0),
+            "storage_size_bytes": stats.get("storageSize", 0),
+            "index_size_bytes": stats.get("totalIndexSize", 0),
+        }
+
+    async def acquire_lock(self, name: str, owner: str, lease_seconds: float) -> bool:
+        """
+        Take (or renew) a named lease; False if another owner holds an unexpired one.
+        """
+        now = datetime.utcnow()
+        try:
+            await self.lock_collection.update_one(
+                {"_id": name, "$or": [{"owner": owner}, {"expires_at": {"$lt": now}}]},
+                {"$set": {"owner": owner, "expires_at": now + timedelta(seconds=lease_seconds)}},
+                upsert=True,
+            )
+            return True
+        except DuplicateKeyError:
+            return False
+
+    async def release_lock(self, name: str, owner: str):
+        await self.lock_collection.delete_one({"_id": name, "owner": owner})
@@ -0,0 +1,157 @@
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError
+from app.database.database import NotificationOutbox
+
+class OutboxRepository:
+    """
+    Pending notification deliveries.
+    - status: "pending" -> "processing" (claimed by a worker) -> "delivered" or "failed".
+    - A "processing" entry whose lease has expired (e.g. the worker restarted mid-delivery)
+      is claimable again. Status writes only apply to the claim they were made under, so a
+      worker that outlived its lease cannot overwrite the entry's new owner.
+    - Digest entries (`digest_open: True`) collect events for one (recipient, type) until
+      their window closes; claiming one closes it, so later events open a new digest.
+      The event that opens a digest is delivered on its own straight away and counted in
+      `leading_events`, so the digest only summarises what followed it.
+    """
+
+    def __init__(self, collection: AsyncIOMotorCollection = NotificationOutbox):
+        self.collection = collection
+
+    @staticmethod
+    def new_entry(user_id, message: str, type: str, fcm_token: Optional[str], created_at: datetime) -> Dict:
+        return {
+            "user_id": user_id,
+            "message": message,
+            "type": type,
+            "fcm_token": fcm_token,
+            "created_at": created_at,
+            "status": "pending",
+            "attempts": 0,
+            "next_attempt_at": created_at,
+        }
+
+    async def add_entries(self, entries: List[Dict]):
+        if entries:
+            await self.collection.insert_many(entries, ordered=False)
+
+    async def add_to_digests(
+        self,
+        recipients: List[Dict],
+        type: str,
+        event: Dict,
+        digest_message: str,
+        window_seconds: float,
+        now: datetime,
+    ) -> List[Dict]:
+        """
+        Add one event to the open digest of every recipient, opening a digest due at
+        `now + window_seconds` for recipients that have none, in a single bulk write.
+        - Returns the recipients whose digest this event opened; the caller delivers the
+          event to them immediately.
+        - `digest_message` is formatted with the final `count` when the digest is delivered.
+        - The unique partial index on digest_key allows one open digest per key; an upsert
+          that loses a race to open it is retried once and then joins the winner's digest.
+        """
+        operations = [self._digest_upsert(recipient, type, event, digest_message, window_seconds, now)
+                      for recipient in recipients]
+        if not operations:
+            return []
+        try:
+            result = await self.collection.bulk_write(operations, ordered=False)
+            opened = list(result.upserted_ids)
+        except BulkWriteError as e:
+            duplicates = [error["index"] for error in e.details["writeErrors"] if error["code"] == 11000]
+            if len(duplicates) < len(e.details["writeErrors"]):
+                raise
+            opened = [upsert["index"] for upsert in e.details["upserted"]]
+            result = await self.collection.bulk_write([operations[index] for index in duplicates], ordered=False)
+            opened += [duplicates[index] for index in result.upserted_ids]
+        return [recipients[index] for index in opened]
+
+    @staticmethod
+    def _digest_upsert(
+        recipient: Dict, type: str, event: Dict, digest_message: str, window_seconds: float, now: datetime
+    ) -> UpdateOne:
+        return UpdateOne(
+            {"digest_key": f"{recipient['_id']}:{type}", "digest_open": True},
+            {
+                "$push": {"events": event},
+                "$inc": {"event_count": 1},
+                "$set": {"fcm_token": recipient.get("fcm_token")},
+                "$setOnInsert": {
+                    "user_id": recipient["_id"],
+                    "type": type,
+                    "digest_message": digest_message,
+                    "leading_events": 1,
+                    "created_at": now,
+                    "status": "pending",
+                    "attempts": 0,
+                    "next_attempt_at": now + timedelta(seconds=window_seconds),
+                },
+            },
+            upsert=True,
+        )
+
+    async def claim_entry(self, worker_id: str, lease_seconds: float) -> Optional[Dict]:
+        """
+        Atomically claim the next due entry, or return None if nothing is due.
+        """
+        now = datetime.utcnow()
+        return await self.collection.find_one_and_update(
+            {
+                "$or": [
+                    {"status": "pending", "next_attempt_at": {"$lte": now}},
+                    {"status": "processing", "claimed_at": {"$lt": now - timedelta(seconds=lease_seconds)}},
+                ]
+            },
+            {"$set": {"status": "processing", "claimed_at": now, "claimed_by": worker_id}, "$unset": {"digest_open": ""}},
+            sort=[("next_attempt_at", 1)],
+            return_document=ReturnDocument.AFTER,
+        )
+
+    @staticmethod
+    def _claim_filter(entry: Dict) -> Dict:
+        return {"_id": entry["_id"], "claimed_by": entry["claimed_by"], "claimed_at": entry["claimed_at"]}
+
+    async def mark_delivered(self, entry: Dict):
+        await self.collection.update_one(
+            self._claim_filter(entry),
+            {"$set": {"status": "delivered", "delivered_at": datetime.utcnow()}, "$unset": {"claimed_by": ""}},
+        )
+
+    async def mark_retry(self, entry: Dict, attempts: int, next_attempt_at: datetime, error: str):
+        await self.collection.update_one(
+            self._claim_filter(entry),
+            {
+                "$set": {
+                    "status": "pending",
+                    "attempts": attempts,
+                    "next_attempt_at": next_attempt_at,
+                    "last_error": error,
+                },
+                "$unset": {"claimed_by": ""},
+            },
+        )
+
+    async def mark_failed(self, entry: Dict, attempts: int, error: str):
+        await self.collection.update_one(
+            self._claim_filter(entry),
+            {
+                "$set": {"status": "failed", "attempts": attempts, "last_error": error, "failed_at": datetime.utcnow()},
+                "$unset": {"claimed_by": ""},
+            },
+        )
+
+    async def drop_tokens(self, tokens: List[str]):
+        """
+        Stop pending entries from pushing to tokens known to be dead; they are still stored as notifications.
+        """
+        if tokens:
+            await self.collection.update_many(
+                {"status": "pending", "fcm_token": {"$in": tokens}},
+                {"$unset": {"fcm_token": ""}},
+            )
@@ -0,0 +1,122 @@
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo import ReturnDocument
+from app.database.database import StoredFiles
+
+class StoredFileRepository:
+    """
+    One document per distinct attachment content in `stored_files`, keyed by its SHA-256:
+    {_id: sha256, path, size, content_type, refs, status, deleting_since, variants, text}.
+    - `refs` names the holders of the content (e.g. "<ticket_id>:image_url"); only a
+      recorded holder can release it, and the content is deleted once `refs` is empty.
+    - status: "pending" (being uploaded) -> "stored"; "deleting" once the last reference is
+      released. A "deleting" record cannot gain references until it is gone, or until its
+      delete is abandoned (see take_over_deletion).
+    - `variants` (name -> path) and `text` cache work derived from the content.
+    """
+
+    def __init__(self, collection: AsyncIOMotorCollection = StoredFiles):
+        self.collection = collection
+
+    async def acquire(self, content_hash: str, path: str, size: int, content_type: str, holder: str) -> Optional[Dict]:
+        """
+        Record `holder` as referencing the content, creating its record if needed.
+        - Returns the record as it was before (None if it is new).
+        - Raises DuplicateKeyError while the content is being deleted.
+        """
+        now = datetime.utcnow()
+        return await self.collection.find_one_and_update(
+            {"_id": content_hash, "status": {"$ne": "deleting"}},
+            {
+                "$addToSet": {"refs": holder},
+                "$set": {"updated_at": now},
+                "$setOnInsert": {
+                    "path": path,
+                    "size": size,
+                    "content_type": content_type,
+                    "status": "pending",
+                    "created_at": now,
+                },
+            },
+            upsert=True,
+            return_document=ReturnDocument.BEFORE,
+        )
+
+    async def mark_stored(self, content_hash: str):
+        await self.collection.update_one({"_id": content_hash, "status": "pending"}, {"$set": {"status": "stored"}})
+
+    async def release(self, content_hash: str, holder: str) -> Optional[Dict]:
+        """
+        Drop `holder`'s reference and return the updated record; None if it held none.
+        """
+        return await self.collection.find_one_and_update(
+            {"_id": content_hash, "refs": holder},
+            {"$pull": {"refs": holder}, "$set": {"updated_at": datetime.utcnow()}},
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def find_by_path(self, path: str) -> Optional[Dict]:
+        return await self.collection.find_one({"path": path})
+
+    async def claim_for_deletion(self, content_hash: str) -> Optional[Dict]:
+        """
+        Mark an unreferenced record as being deleted; None if it is referenced again or already claimed.
+        """
+        now = datetime.utcnow()
+        return await self.collection.find_one_and_update(
+            {"_id": content_hash, "refs": {"$size": 0}, "status": {"$ne": "deleting"}},
+            {"$set": {"status": "deleting", "deleting_since": now, "updated_at": now}},
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def take_over_deletion(self, content_hash: str, stale_seconds: float) -> bool:
+        """
+        Turn a delete that has been running for over `stale_seconds` (its process most likely
+        died) back into a pending upload, so the content can be stored and referenced again.
+        """
+        result = await self.collection.update_one(
+            {
+                "_id": content_hash,
+                "status": "deleting",
+                "deleting_since": {"$lt": datetime.utcnow() - timedelta(seconds=stale_seconds)},
+            },
+            {"$set": {"status": "pending", "updated_at": datetime.utcnow()}, "$unset": {"deleting_since": ""}},
+        )
+        return result.modified_count > 0
+
+    async def restore(self, content_hash: str):
+        """
+        Undo claim_for_deletion after the stored objects could not be deleted.
+        """
+        await self.collection.update_one(
+            {"_id": content_hash, "status": "deleting"},
+            {"$set": {"status": "stored"}, "$unset": {"deleting_since": ""}},
+        )
+
+    async def delete(self, content_hash: str):
+        await self.collection.delete_one({"_id": content_hash, "status": "deleting"})
+
+    async def set_variants(self, content_hash: str, variants: Dict[str, str]):
+        await self.collection.update_one({"_id": content_hash}, {"$set": {"variants": variants}})
+
+    async def set_text(self, content_hash: str, text: str):
+        await self.collection.update_one({"_id": content_hash}, {"$set": {"text": text}})
+
+    async def totals(self) -> Dict:
+        """
+        Distinct objects, their total size, references, and bytes saved by sharing them.
+        """
+        result = await self.collection.aggregate([
+            {"$match": {"status": "stored"}},
+            {"$group": {
+                "_id": None,
+                "objects": {"$sum": 1},
+                "bytes": {"$sum": "$size"},
+                "references": {"$sum": {"$size": "$refs"}},
+                "bytes_saved": {"$sum": {"$multiply": ["$size", {"$max": [{"$subtract": [{"$size": "$refs"}, 1]}, 0]}]}},
+            }},
+        ]).to_list(length=1)
+        totals = result[0] if result else {"objects": 0, "bytes": 0, "references": 0, "bytes_saved": 0}
+        totals.pop("_id", None)
+        return totals
@@ -1,34 +1,103 @@
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
 from bson import ObjectId
 from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo import ASCENDING, DESCENDING, ReturnDocument
 from app.database.database import Tickets
+from app.utils.pagination import DEFAULT_PAGE_SIZE, fetch_page
 
 class TicketRepository:
     def __init__(self, collection: AsyncIOMotorCollection = Tickets):
         self.collection = collection
 
-    async def get_all_tickets(self):
-        return await self.collection.find().to_list(length=None)
+    @staticmethod
+    def build_ticket_query(
+        role: str,
+        user_id: Optional[str] = None,
+        status: Optional[str] = None,
+        created_after: Optional[datetime] = None,
+        created_before: Optional[datetime] = None,
+    ) -> Dict:
+        """
+        Build a single indexed query for a ticket listing.
+        - Admin: all tickets; doctor: assigned_doctor_id; patient: patient_id.
+        - Creation date ranges are expressed on _id, whose timestamp is the creation time,
+          so they are served by the same (owner, status, _id) indexes as the listing itself.
+        """
+        query: Dict = {}
+        if role == "doctor":
+            query["assigned_doctor_id"] = ObjectId(user_id)
+        elif role == "patient":
+            query["patient_id"] = ObjectId(user_id)
+        if status:
+            query["status"] = status
 
-    async def get_tickets_by_doctor(self, doctor_id: str):
-        return await self.collection.find({"assigned_doctor_id": ObjectId(doctor_id)}).to_list(length=None)
+        id_range = {}
+        if created_after:
+            id_range["$gte"] = ObjectId.from_datetime(created_after)
+        if created_before:
+            id_range["$lt"] = ObjectId.from_datetime(created_before)
+        if id_range:
+            query["_id"] = id_range
+        return query
 
-    async def get_tickets_by_patient(self, patient_id: str):
-        return await self.collection.find({"patient_id": ObjectId(patient_id)}).to_list(length=None)
+    async def find_tickets(
+        self,
+        role: str,
+        user_id: Optional[str] = None,
+        status: Optional[str] = None,
+        created_after: Optional[datetime] = None,
+        created_before: Optional[datetime] = None,
+        newest_first: bool = True,
+        limit: int = DEFAULT_PAGE_SIZE,
+        cursor: Optional[str] = None,
+    ) -> Tuple[List[Dict], Optional[str]]:
+        """
+        Return one page of tickets matching the filters and the cursor for the next page.
+        """
+        query = self.build_ticket_query(role, user_id, status, created_after, created_before)
+        return await fetch_page(
+            self.collection, query, limit, cursor, direction=DESCENDING if newest_first else ASCENDING
+        )
+
+    async def get_all_tickets(self, limit: int = DEFAULT_PAGE_SIZE, cursor: Optional[str] = None):
+        return await self.find_tickets("admin", limit=limit, cursor=cursor)
+
+    async def get_tickets_by_doctor(self, doctor_id: str, limit: int = DEFAULT_PAGE_SIZE, cursor: Optional[str] = None):
+        return await self.find_tickets("doctor", doctor_id, limit=limit, cursor=cursor)
+
+    async def get_tickets_by_patient(self, patient_id: str, limit: int = DEFAULT_PAGE_SIZE, cursor: Optional[str] = None):
+        return await self.find_tickets("patient", patient_id, limit=limit, cursor=cursor)
 
     async def get_ticket_by_id(self, ticket_id: str):
         return await self.collection.find_one({"_id": ObjectId(ticket_id)})
 
     async def create_ticket(self, ticket_data: dict):
-        result = await self.collection.insert_one(ticket_data)
-        return await self.get_ticket_by_id(ObjectId(result.inserted_id))
+        """
+        Insert a ticket and return it without re-reading it.
+        - The caller's dict is left untouched; the returned copy carries the new _id.
+        """
+        ticket = dict(ticket_data)
+        await self.collection.insert_one(ticket)
+        return ticket
 
-    async def update_ticket(self, ticket_id: str, update_data: dict):
-        await self.collection.update_one({"_id": ObjectId(ticket_id)}, {"$set": update_data})
-        return await self.get_ticket_by_id(ticket_id)
+    async def update_ticket(self, ticket_id: str, update_data: dict, conditions: Optional[Dict] = None):
+        """
+        Apply a $set to a ticket and return the updated document in one round trip.
+        - `conditions` are extra filters (e.g. ownership) the ticket must match.
+        - Returns None when no ticket matched.
+        """
+        return await self.collection.find_one_and_update(
+            {"_id": ObjectId(ticket_id), **(conditions or {})},
+            {"$set": update_data},
+            return_document=ReturnDocument.AFTER,
+        )
 
-    async def delete_ticket(self, ticket_id: str):
-        result = await self.collection.delete_one({"_id": ObjectId(ticket_id)})
-        return result.deleted_count > 0
+    async def delete_ticket(self, ticket_id: str, conditions: Optional[Dict] = None):
+        """
+        Delete a ticket and return the deleted document, or None when no ticket matched.
+        """
+        return await self.collection.find_one_and_delete({"_id": ObjectId(ticket_id), **(conditions or {})})
     
-    async def get_tickets_by_status(self, status: str):
-        return await self.collection.find({"status": status}).to_list(length=None)
\ No newline at end of file
+    async def get_tickets_by_status(self, status: str, limit: int = DEFAULT_PAGE_SIZE, cursor: Optional[str] = None):
+        return await self.find_tickets("admin", status=status, limit=limit, cursor=cursor)
\ No newline at end of file
@@ -1,15 +1,25 @@
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Tuple
 from bson import ObjectId
 from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo import ReturnDocument
 from app.database.database import Users
+from app.core.cache import RECIPIENT_FIELDS, invalidate_recipients, invalidate_user, recipient_cache
 
 class UserRepository:
     def __init__(self, collection: AsyncIOMotorCollection = Users):
         self.collection = collection
 
     async def create_user(self, user_data: dict):
-        result = await self.collection.insert_one(user_data)
-        return await self.get_user_by_id(result.inserted_id)
+        """
+        Insert a user and return it without re-reading it.
+        - The caller's dict is left untouched; the returned copy carries the new _id.
+        """
+        user = dict(user_data)
+        await self.collection.insert_one(user)
+        # Only the list the new user belongs on changes; registrations are "pending" and
+        # leave the cached ("admin", "accepted") list used to notify admins intact
+        recipient_cache.invalidate((user.get("role"), user.get("status")))
+        return user
 
     async def get_user_by_username(self, username: str):
         return await self.collection.find_one({"username": username})
@@ -24,8 +34,19 @@ class UserRepository:
         return await self.collection.find_one({"_id": ObjectId(user_id)})
 
     async def update_user(self, user_id: str, update_data: dict):
-        await self.collection.update_one({"_id": ObjectId(user_id)}, {"$set": update_data})
-        return await self.get_user_by_id(user_id)
+        """
+        Apply a $set to a user and return the updated document in one round trip.
+        - Returns None when the user does not exist.
+        """
+        user = await self.collection.find_one_and_update(
+            {"_id": ObjectId(user_id)},
+            {"$set": update_data},
+            return_document=ReturnDocument.AFTER,
+        )
+        invalidate_user(user_id)
+        if any(field in update_data for field in RECIPIENT_FIELDS):
+            invalidate_recipients()
+        return user
     
     async def append_to_array(self, user_id: str, field: str, items: List[Any]) -> Dict:
         """
@@ -33,15 +54,19 @@ class UserRepository:
         - Uses the $push operator with $each to append multiple items.
         - Works for any array field (e.g., patient_data.medications, patient_data.allergies).
         """
-        await self.collection.update_one(
+        user = await self.collection.find_one_and_update(
             {"_id": ObjectId(user_id)},
-            {"$push": {field: {"$each": items}}}  # Append items to the specified array field
+            {"$push": {field: {"$each": items}}},  # Append items to the specified array field
+            return_document=ReturnDocument.AFTER,
         )
-        return await self.get_user_by_id(user_id) 
+        invalidate_user(user_id)
+        return user
 
 
     async def delete_user(self, user_id: str):
         result = await self.collection.delete_one({"_id": user_id})
+        invalidate_user(user_id)
+        invalidate_recipients()
         return result.deleted_count > 0
 
     async def get_all_users(self, skip: int = 0, limit: int = 100):
@@ -60,9 +85,44 @@ class UserRepository:
 
     async def get_users_by_role_and_status(self, role: str, status: str):
         return await self.collection.find({"role": role, "status": status}).to_list(length=None)
+
+    async def get_recipients(self, role: str, status: str = "accepted") -> List[Dict]:
+        """
+        Return the `_id` and `fcm_token` of every user with the given role and status,
+        for role-based broadcasts such as notifying all admins.
+        - Served from recipient_cache; the query only runs after a TTL expiry or after a
+          user's role, status or FCM token has changed.
+        """
+        key = (role, status)
+        recipients = recipient_cache.get(key)
+        if recipients is None:
+            recipients = await self.collection.find(
+                {"role": role, "status": status}, {"_id": 1, "fcm_token": 1}
+            ).to_list(length=None)
+            recipient_cache.set(key, recipients)
+        return recipients
     
     async def update_fcm_token(self, user_id: str, fcm_token: str):
         await self.collection.update_one(
             {"_id": ObjectId(user_id)},
             {"$set": {"fcm_token": fcm_token}}
-        )
\ No newline at end of file
+        )
+        invalidate_user(user_id)
+        invalidate_recipients()
+
+    async def clear_fcm_tokens(self, dead_tokens: List[Tuple[Any, str]]) -> int:
+        """
+        Unset FCM tokens that FCM reported as dead, given (user_id, token) pairs, in one write.
+        - A user whose token has changed since the failed send keeps the new token.
+        - Returns the number of users whose token was cleared.
+        """
+        if not dead_tokens:
+            return 0
+        result = await self.collection.update_many(
+            {"$or": [{"_id": ObjectId(user_id), "fcm_token": token} for user_id, token in dead_tokens]},
+            {"$unset": {"fcm_token": ""}},
+        )
+        for user_id, _ in dead_tokens:
+            invalidate_user(user_id)
+        invalidate_recipients()
+        return result.modified_count
@@ -6,6 +6,17 @@ from app.dependencies.auth_dependencies import get_current_admin
 from app.core.exceptions import TicketNotFoundException, UserNotFoundException, UnauthorizedAccessException
 from app.services.ticket_service import TicketService
 from app.services.user_service import UserService
+from app.core.cache import recipient_cache, user_cache
+from app.core.security import hashing_stats
+from app.core.google_cloud import storage_stats
+from app.core.images import image_stats
+from app.core.uploads import upload_budget
+from app.services.file_store import file_store
+from app.core.notification_hub import notification_hub
+from app.core.push_dispatcher import push_dispatcher
+from app.services.notification_compactor import notification_compactor
+from app.services.outbox_worker import outbox_worker
+from app.utils.mongo_utils import MongoJSONResponse
 
 # Initialize the router
 admin_router = APIRouter(prefix="/admin", tags=["admin"])
@@ -19,7 +30,7 @@ async def get_pending_approvals(
     Get a list of users with status 'pending'.
     """
     try:
-        return await user_service.get_users_by_status(status="pending")
+        return MongoJSONResponse(await user_service.get_users_by_status(status="pending"))
     except UserNotFoundException as e:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -41,7 +52,7 @@ async def approve_user(
     Approve a user by updating their status to 'accepted'.
     """
     try:
-        return await admin_service.update_user_status(user_id, "accepted")
+        return MongoJSONResponse(await admin_service.update_user_status(user_id, "accepted"))
     except UserNotFoundException as e:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -58,7 +69,7 @@ async def reject_user(
     Reject a user by updating their status to 'rejected'.
     """
     try:
-        return await admin_service.update_user_status(user_id, "rejected")
+        return MongoJSONResponse(await admin_service.update_user_status(user_id, "rejected"))
     except UserNotFoundException as e:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -74,7 +85,7 @@ async def get_all_patients(
     Get all patients with status 'accepted'.
     """
     try:
-        return await admin_service.get_all_patients()
+        return MongoJSONResponse(await admin_service.get_all_patients())
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -90,7 +101,7 @@ async def get_all_doctors(
     Get all doctors with status 'accepted'.
     """
     try:
-        return await admin_service.get_all_doctors()
+        return MongoJSONResponse(await admin_service.get_all_doctors())
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -126,9 +137,83 @@ async def assign_doctor(
     Assign a doctor to a ticket (admin only).
     """
     try:
-        return await ticket_service.assign_doctor(ticket_id, doctor_id)
+        return MongoJSONResponse(await ticket_service.assign_doctor(ticket_id, doctor_id))
     except TicketNotFoundException as e:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=str(e),
-        )
\ No newline at end of file
+        )
+
+@admin_router.get("/metrics")
+async def get_metrics(
+    current_user: dict = Depends(get_current_admin),
+):
+    """
+    Get in-process runtime metrics for this worker (admin only).
+    """
+    return {
+        "user_cache": user_cache.stats(),
+        "recipient_cache": recipient_cache.stats(),
+        "password_hashing": hashing_stats(),
+        "push": push_dispatcher.stats(),
+        "storage": storage_stats(),
+        "uploads": upload_budget.stats(),
+        "images": image_stats(),
+        "file_store": file_store.stats(),
+        "notification_outbox": outbox_worker.stats(),
+        "notification_streams": notification_hub.stats(),
+        "notification_retention": notification_compactor.stats(),
+    }
+
+@admin_router.get("/notifications/retention")
+async def get_notification_retention(
+    current_user: dict = Depends(get_current_admin),
+):
+    """
+    Get the size of the notifications collection and what compaction has reclaimed (admin only).
+    """
+    try:
+        collection = await notification_compactor.retention_repository.collection_stats()
+        return MongoJSONResponse({"collection": collection, **notification_compactor.stats()})
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=str(e),
+        )
+
+@admin_router.get("/files")
+async def get_stored_files(
+    current_user: dict = Depends(get_current_admin),
+):
+    """
+    Get the number and size of stored attachment objects and the bytes saved by deduplication (admin only).
+    """
+    try:
+        totals = await file_store.stored_file_repository.totals()
+        return {**totals, **file_store.stats()}
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=str(e),
+        )
+
+@admin_router.post("/notifications/compact")
+async def compact_notifications(
+    current_user: dict = Depends(get_current_admin),
+):
+    """
+    Run notification compaction now instead of waiting for the next scheduled run (admin only).
+    """
+    try:
+        report = await notification_compactor.run_once()
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=str(e),
+        )
+    if report is None:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Notification compaction is already running",
+        )
+    return MongoJSONResponse(report)
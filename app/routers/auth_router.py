@@ -11,6 +11,7 @@ from app.core.exceptions import (
     UserAlreadyExistsException,
     InvalidCredentialsException,
     UserNotFoundException,
+    HashingCapacityException,
 )
 
 auth_router = APIRouter(prefix="/auth", tags=["auth"])
@@ -31,6 +32,12 @@ async def register_user(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=str(e),
         )
+    except HashingCapacityException as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e),
+            headers={"Retry-After": "1"},
+        )
 
 @auth_router.post("/login", response_model=Token)
 async def login(
@@ -49,6 +56,12 @@ async def login(
             detail=str(e),
             headers={"WWW-Authenticate": "Bearer"},
         )
+    except HashingCapacityException as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e),
+            headers={"Retry-After": "1"},
+        )
 
 @auth_router.get("/get_user/{user_id}", response_model=UserResponse)
 async def get_profile(
@@ -1,10 +1,13 @@
 from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, File, UploadFile, Form
+from fastapi import APIRouter, Depends, HTTPException, File, Query, Response, UploadFile, Form
 from app.services.chat_service import ChatService
 from app.dependencies.service_dependencies import get_chat_service, get_ticket_service
 from app.dependencies.auth_dependencies import get_current_user
-from app.schemas.chat_schemas import ChatSession
+from app.schemas.chat_schemas import ChatList, ChatMessagePage, ChatSession
 from app.services.ticket_service import TicketService
+from app.core.exceptions import AttachmentTooLargeException, ChatSessionConflictException, InvalidCursorException
+from app.core.uploads import attachment_file
+from app.utils.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
 
 chat_router = APIRouter(prefix="/chats", tags=["chats"])
 
@@ -32,16 +35,14 @@ async def start_chat(
         print(f"Received image: {image}")
         print(f"Received document: {document}")
 
-        # If files are uploaded manually, read them as bytes
+        # Uploaded files are already spooled to disk; pass the file handles on rather than reading them into memory
         if image:
-            print(f"Reading image file: {image.filename}")
-            image_data = await image.read()
-            print(f"Image file size: {len(image_data)} bytes")
+            print(f"Received image file: {image.filename} ({image.size} bytes)")
+            image_data = attachment_file(image)
 
         if document:
-            print(f"Reading document file: {document.filename}")
-            document_data = await document.read()
-            print(f"Document file size: {len(document_data)} bytes")
+            print(f"Received document file: {document.filename} ({document.size} bytes)")
+            document_data = attachment_file(document)
 
         # Start the chat session
         print("Starting chat session...")
@@ -55,6 +56,8 @@ async def start_chat(
         )
     except HTTPException:
         raise
+    except AttachmentTooLargeException as e:
+        raise HTTPException(status_code=413, detail=str(e))
     except Exception as e:
         print(f"Error in start_chat: {e}")  # Debug log for errors
         raise HTTPException(status_code=500, detail=str(e))
@@ -70,21 +73,22 @@ async def continue_chat(
 ):
     """
     Continue an existing chat session.
+    - The response carries the session's most recent messages; page older ones with GET /chats/{session_id}/messages.
     """
     try:
-        # Read file contents if provided
-        image_bytes = await image.read() if image else None
-        document_bytes = await document.read() if document else None
-
-        # Continue the chat session
+        # Pass the spooled upload files on without reading them into memory
         return await chat_service.continue_chat(
             session_id=session_id,
             message=message,
-            image=image_bytes,
-            document=document_bytes,
+            image=attachment_file(image),
+            document=attachment_file(document),
         )
     except HTTPException:
         raise
+    except AttachmentTooLargeException as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except ChatSessionConflictException as e:
+        raise HTTPException(status_code=409, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -122,24 +126,50 @@ async def get_chat_session(
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@chat_router.get("/user/{user_id}", response_model=List[ChatSession])
+@chat_router.get("/{session_id}/messages", response_model=ChatMessagePage)
+async def get_chat_messages(
+    session_id: str,
+    before: Optional[int] = Query(None, ge=0, description="`before` value from the previous page; omit for the newest messages"),
+    current_user: dict = Depends(get_current_user),
+    chat_service: ChatService = Depends(get_chat_service),
+):
+    """
+    Retrieve a chat session's messages one page at a time, newest page first.
+    """
+    try:
+        return await chat_service.get_chat_messages(session_id, before)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@chat_router.get("/user/{user_id}", response_model=List[ChatList])
 async def get_chats_by_user_and_ticket(
     user_id: str,
+    response: Response,
     ticket_id: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Maximum number of chats to return"),
+    cursor: Optional[str] = Query(None, description="Cursor from the X-Next-Cursor header of the previous page"),
     current_user: dict = Depends(get_current_user),
     chat_service: ChatService = Depends(get_chat_service),
 ):
     """
-    Retrieve all chat sessions for a specific user.
+    Retrieve chat session summaries for a specific user, newest first.
     - If `ticket_id` is provided, filter chats by both `user_id` and `ticket_id`.
     - If `ticket_id` is not provided, return all chats for the `user_id`.
+    - Each summary has the message count and a preview of the last message; use
+      `GET /chats/{session_id}` for the full conversation.
     """
     try:
-        chats = await chat_service.get_chats_by_user_and_ticket(user_id, ticket_id)
+        chats, next_cursor = await chat_service.get_chats_by_user_and_ticket(user_id, ticket_id, limit, cursor)
         if not chats:
             raise HTTPException(status_code=404, detail="No chats found for the given user and ticket")
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
         return chats
     except HTTPException:
         raise
+    except InvalidCursorException as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
\ No newline at end of file
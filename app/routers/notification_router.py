@@ -1,20 +1,139 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+import asyncio
+import json
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
 from app.services.notification_service import NotificationService
 from app.dependencies.service_dependencies import get_notification_service
 from app.dependencies.auth_dependencies import get_current_user
+from app.core.config import NOTIFICATION_STREAM_HEARTBEAT_SECONDS, NOTIFICATION_STREAM_IDLE_TIMEOUT_SECONDS
+from app.core.exceptions import InvalidCursorException, NotificationNotFoundException, StreamCapacityException
+from app.core.notification_hub import CLOSED, OVERFLOWED, Subscription, notification_hub
+from app.utils.mongo_utils import MongoJSONResponse, bson_json_default
+from app.utils.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
 
 notification_router = APIRouter(prefix="/notifications", tags=["notifications"])
 
+
+async def _sse_events(subscription: Subscription):
+    """
+    Format a hub subscription as Server-Sent Events.
+    - A comment line is sent every heartbeat interval so proxies keep the connection open.
+    - The stream ends after the idle timeout without events, or when the hub closes the
+      subscription; `event: overflow` tells the client it missed events and must resync.
+    """
+    loop = asyncio.get_running_loop()
+    last_event_at = loop.time()
+    try:
+        while True:
+            try:
+                item = await asyncio.wait_for(subscription.queue.get(), NOTIFICATION_STREAM_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                if loop.time() - last_event_at >= NOTIFICATION_STREAM_IDLE_TIMEOUT_SECONDS:
+                    return
+                yield ": keep-alive\n\n"
+                continue
+
+            if item is OVERFLOWED:
+                yield "event: overflow\ndata: {}\n\n"
+                return
+            if item is CLOSED:
+                return
+            last_event_at = loop.time()
+            yield f"event: notification\ndata: {json.dumps(item, default=bson_json_default)}\n\n"
+    finally:
+        notification_hub.unsubscribe(subscription)
+
+
+@notification_router.get("/stream")
+async def stream_notifications(
+    current_user: dict = Depends(get_current_user),
+):
+    """
+    Stream the current user's new notifications as Server-Sent Events.
+    - Fetch GET /notifications on (re)connect; the stream only carries notifications created afterwards.
+    """
+    try:
+        subscription = notification_hub.subscribe(current_user["_id"])
+    except StreamCapacityException as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e),
+            headers={"Retry-After": "5"},
+        )
+    return StreamingResponse(
+        _sse_events(subscription),
+        media_type="text/event-stream",
+        # Stop reverse proxies from buffering the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        # The generator's finally never runs if the client leaves before it starts; unsubscribing twice is a no-op
+        background=BackgroundTask(notification_hub.unsubscribe, subscription),
+    )
+
 @notification_router.get("/")
 async def get_notifications(
+    unread_only: bool = Query(False, description="Only return unread notifications"),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Maximum number of notifications to return"),
+    cursor: Optional[str] = Query(None, description="Cursor from the X-Next-Cursor header of the previous page"),
     current_user: dict = Depends(get_current_user),
     notification_service: NotificationService = Depends(get_notification_service),
 ):
     """
-    Get all notifications for the current user.
+    Get the current user's notifications, read and unread, newest first.
+    - Notifications are returned one page at a time. When more exist,
+      the X-Next-Cursor response header holds the cursor for the next page.
     """
     try:
-        return await notification_service.get_notifications(current_user["_id"])
+        notifications, next_cursor = await notification_service.get_notifications(
+            current_user["_id"], unread_only, limit, cursor
+        )
+        headers = {"X-Next-Cursor": next_cursor} if next_cursor else None
+        return MongoJSONResponse(notifications, headers=headers)
+    except InvalidCursorException as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e),
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=str(e),
+        )
+
+@notification_router.get("/unread-count")
+async def get_unread_count(
+    current_user: dict = Depends(get_current_user),
+    notification_service: NotificationService = Depends(get_notification_service),
+):
+    """
+    Get the number of unread notifications for the current user (e.g. for an app badge).
+    """
+    try:
+        return {"unread": await notification_service.get_unread_count(current_user["_id"])}
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=str(e),
+        )
+
+@notification_router.post("/{notification_id}/read")
+async def mark_notification_as_read(
+    notification_id: str,
+    current_user: dict = Depends(get_current_user),
+    notification_service: NotificationService = Depends(get_notification_service),
+):
+    """
+    Mark a single notification as read.
+    """
+    try:
+        await notification_service.mark_as_read(current_user["_id"], notification_id)
+        return {"message": "Notification marked as read"}
+    except NotificationNotFoundException as e:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=str(e),
+        )
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -0,0 +1,62 @@
+import os
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.responses import FileResponse
+from app.core.exceptions import AttachmentTooLargeException
+from app.core.storage import LocalStorage, StorageBackend
+from app.core.uploads import spool_chunks
+from app.dependencies.service_dependencies import get_storage
+
+# Stand-in for the bucket when STORAGE_BACKEND=local: accepts direct uploads and serves files.
+storage_router = APIRouter(prefix="/storage", tags=["storage"])
+
+
+def _local_storage(storage: StorageBackend = Depends(get_storage)) -> LocalStorage:
+    if not isinstance(storage, LocalStorage):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not found")
+    return storage
+
+
+@storage_router.put("/local/upload")
+async def upload_local_file(
+    request: Request,
+    token: str = Query(..., description="Token from the issued upload URL"),
+    storage: LocalStorage = Depends(_local_storage),
+):
+    """
+    Receive a direct upload for a URL issued by LocalStorage.create_upload_target.
+    """
+    try:
+        claims = storage.verify_upload_token(token)
+        storage.resolve(claims["path"])
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=str(e))
+
+    # Spool the body off the event loop (in memory while small), then hand it to the backend
+    try:
+        spool = await spool_chunks(request.stream(), claims["max_size"])
+    except AttachmentTooLargeException:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail="File is too large")
+    try:
+        size = spool.seek(0, os.SEEK_END)
+        spool.seek(0)
+        await storage.put(claims["path"], spool, request.headers.get("content-type", "application/octet-stream"))
+    finally:
+        spool.close()
+    return {"path": claims["path"], "size": size}
+
+
+@storage_router.get("/local/files/{path:path}")
+async def get_local_file(
+    path: str,
+    storage: LocalStorage = Depends(_local_storage),
+):
+    """
+    Serve a file stored by LocalStorage.
+    """
+    try:
+        stored = await storage.stat(path)
+    except ValueError:
+        stored = None
+    if stored is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="File not found")
+    return FileResponse(storage.resolve(path), media_type=stored.content_type)
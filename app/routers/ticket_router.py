@@ -1,35 +1,71 @@
-from typing import Dict, List, Optional
+from datetime import datetime
+from typing import Dict, List, Literal, Optional
 from fastapi import APIRouter, Depends, File, Form, HTTPException, Query, UploadFile, status
 from bson import ObjectId
 from app.services.report_service import ReportService
 from app.services.ticket_service import TicketService
 from app.dependencies.service_dependencies import get_report_service, get_ticket_service, get_user_service
 from app.dependencies.auth_dependencies import get_current_user, get_current_doctor, get_current_admin
-from app.core.exceptions import TicketNotFoundException, UnauthorizedAccessException
+from app.core.exceptions import (
+    AttachmentNotFoundException,
+    AttachmentTooLargeException,
+    InvalidAttachmentException,
+    InvalidCursorException,
+    StorageCapacityException,
+    StorageTimeoutException,
+    TicketNotFoundException,
+    UnauthorizedAccessException,
+)
 from app.services.user_service import UserService
+from app.schemas.ticket_schemas import AttachmentConfirmRequest, AttachmentUploadRequest, AttachmentUploadResponse
+from app.core.uploads import attachment_file
+from app.utils.mongo_utils import MongoJSONResponse
+from app.utils.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
 
 # Initialize the router
 ticket_router = APIRouter(prefix="/tickets", tags=["tickets"])
 
 @ticket_router.get("/")
 async def get_tickets(
-    status: Optional[str] = Query(None, description="Filter tickets by status (e.g., 'resolved' or 'pending')"),
+    status_filter: Optional[str] = Query(None, alias="status", description="Filter tickets by status (e.g., 'resolved' or 'pending')"),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Maximum number of tickets to return"),
+    cursor: Optional[str] = Query(None, description="Cursor from the X-Next-Cursor header of the previous page"),
+    created_after: Optional[datetime] = Query(None, description="Only tickets created at or after this time"),
+    created_before: Optional[datetime] = Query(None, description="Only tickets created before this time"),
+    sort: Literal["newest", "oldest"] = Query("newest", description="Sort order by creation time"),
     current_user: dict = Depends(get_current_user),
     ticket_service: TicketService = Depends(get_ticket_service),
 ):
     """
-    Get tickets based on the user's role and optional status filter.
+    Get tickets based on the user's role and optional filters.
     - Admin: All tickets
     - Doctor: Assigned tickets
     - Patient: Own tickets
+    - Tickets are returned one page at a time. When more tickets exist,
+      the X-Next-Cursor response header holds the cursor for the next page.
     """
     try:
-        return await ticket_service.get_tickets(current_user, status)
+        tickets, next_cursor = await ticket_service.get_tickets(
+            current_user,
+            status_filter,
+            limit,
+            cursor,
+            created_after=created_after,
+            created_before=created_before,
+            newest_first=sort == "newest",
+        )
+        headers = {"X-Next-Cursor": next_cursor} if next_cursor else None
+        return MongoJSONResponse(tickets, headers=headers)
     except UnauthorizedAccessException as e:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail=str(e),
-        ) 
+        )
+    except InvalidCursorException as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e),
+        )
 
 @ticket_router.get("/{ticket_id}")
 async def get_ticket(
@@ -41,7 +77,7 @@ async def get_ticket(
     Get a specific ticket with role-based access.
     """
     try:
-        return await ticket_service.get_ticket_by_id(ticket_id, current_user)
+        return MongoJSONResponse(await ticket_service.get_ticket_by_id(ticket_id, current_user))
     except (TicketNotFoundException, UnauthorizedAccessException) as e:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND if isinstance(e, TicketNotFoundException) else status.HTTP_403_FORBIDDEN,
@@ -76,21 +112,126 @@ async def create_ticket(
             "symptoms": symptoms,
             "status": "pending"  
         }
-        
-        ticket = await ticket_service.create_ticket(ticket_data)
-        if image:
-            ticket_data["image_url"] = await ticket_service.upload_file(image, ticket["_id"], "images")
-        if document:
-            ticket_data["docs_url"] = await ticket_service.upload_file(document, ticket["_id"], "docs")
-        updated_ticket = await ticket_service.update_ticket(ticket["_id"], ticket_data, current_user)
-        return updated_ticket
-    
+
+        # Refuse oversized files before anything is stored
+        attachment_file(image)
+        attachment_file(document)
+
+        # Files are stored before the ticket exists, so a rejected upload (e.g. a 503 the
+        # client retries) never leaves a ticket behind; the id is chosen up front for them
+        ticket_id = ObjectId()
+        ticket_data.update(await ticket_service.upload_attachments(ticket_id, image, document))
+
+        ticket = await ticket_service.create_ticket({"_id": ticket_id, **ticket_data})
+        return MongoJSONResponse(ticket, status_code=status.HTTP_201_CREATED)
+
+    except AttachmentTooLargeException as e:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=str(e),
+        )
+    except StorageCapacityException as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e),
+            headers={"Retry-After": "5"},
+        )
+    except StorageTimeoutException as e:
+        raise HTTPException(
+            status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+            detail=str(e),
+        )
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=str(e),
         )
     
+@ticket_router.post("/{ticket_id}/attachments/upload-url", response_model=AttachmentUploadResponse)
+async def create_attachment_upload_url(
+    ticket_id: str,
+    request: AttachmentUploadRequest,
+    current_user: dict = Depends(get_current_user),
+    ticket_service: TicketService = Depends(get_ticket_service),
+):
+    """
+    Get a short-lived URL for uploading a ticket attachment directly to storage (ticket owner only).
+    - Upload the file with the returned method and headers, then call the confirm endpoint with `path`.
+    """
+    try:
+        path, target = await ticket_service.create_attachment_upload(
+            ticket_id, request.file_type, request.filename, request.content_type, current_user
+        )
+        return AttachmentUploadResponse(
+            path=path,
+            upload_url=target.url,
+            method=target.method,
+            headers=target.headers,
+            expires_at=target.expires_at,
+        )
+    except TicketNotFoundException as e:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=str(e),
+        )
+    except UnauthorizedAccessException as e:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail=str(e),
+        )
+    except StorageCapacityException as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e),
+            headers={"Retry-After": "5"},
+        )
+    except StorageTimeoutException as e:
+        raise HTTPException(
+            status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+            detail=str(e),
+        )
+
+@ticket_router.post("/{ticket_id}/attachments/confirm")
+async def confirm_attachment(
+    ticket_id: str,
+    request: AttachmentConfirmRequest,
+    current_user: dict = Depends(get_current_user),
+    ticket_service: TicketService = Depends(get_ticket_service),
+):
+    """
+    Confirm a direct upload and record it as the ticket's image_url or docs_url (ticket owner only).
+    """
+    try:
+        return MongoJSONResponse(
+            await ticket_service.confirm_attachment(ticket_id, request.file_type, request.path, current_user)
+        )
+    except (TicketNotFoundException, AttachmentNotFoundException) as e:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=str(e),
+        )
+    except UnauthorizedAccessException as e:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail=str(e),
+        )
+    except InvalidAttachmentException as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e),
+        )
+    except StorageCapacityException as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e),
+            headers={"Retry-After": "5"},
+        )
+    except StorageTimeoutException as e:
+        raise HTTPException(
+            status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+            detail=str(e),
+        )
+
 @ticket_router.put("/{ticket_id}")
 async def update_ticket(
     ticket_id: str,
@@ -102,12 +243,17 @@ async def update_ticket(
     Update a ticket (patient only).
     """
     try:
-        return await ticket_service.update_ticket(ticket_id, update_data, current_user)
+        return MongoJSONResponse(await ticket_service.update_ticket(ticket_id, update_data, current_user))
     except (TicketNotFoundException, UnauthorizedAccessException) as e:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND if isinstance(e, TicketNotFoundException) else status.HTTP_403_FORBIDDEN,
             detail=str(e),
         )
+    except InvalidAttachmentException as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e),
+        )
 
 @ticket_router.delete("/{ticket_id}", status_code=status.HTTP_200_OK)
 async def delete_ticket(
@@ -159,13 +305,8 @@ async def submit_report(
                 detail="A report already exists for this ticket.",
             )
 
-        image_url = None
-        if image:
-            image_url = await ticket_service.upload_report_file(image, ticket_id, "images")
-
-        docs_url = None
-        if document:
-            docs_url = await ticket_service.upload_report_file(document, ticket_id, "docs")
+        # Upload the image (with its derivatives) and the document concurrently
+        file_fields = await ticket_service.upload_attachments(ticket_id, image, document, report=True)
 
         report_data = {
             "ticket_id": ticket_id,
@@ -173,10 +314,17 @@ async def submit_report(
             "diagnosis": diagnosis,
             "recommendations": recommendations,
             "medications": medications,  
-            "image_url": image_url,
-            "docs_url": docs_url,
+            "image_url": file_fields.get("image_url"),
+            "image_variants": file_fields.get("image_variants"),
+            "docs_url": file_fields.get("docs_url"),
         }
-        report = await report_service.create_report(report_data, current_user)
+        try:
+            report = await report_service.create_report(report_data, current_user)
+        except BaseException:
+            # The insert sets _id; until then nothing references the uploaded files
+            if "_id" not in report_data:
+                await ticket_service.release_uploads(ticket_id, file_fields, report=True)
+            raise
 
         # Append medications to the patient's profile
         patient_id = ticket["patient_id"]
@@ -185,7 +333,7 @@ async def submit_report(
             {"patient_data.medications": medications} 
         )
 
-        return report
+        return MongoJSONResponse(report, status_code=status.HTTP_201_CREATED)
 
     except TicketNotFoundException as e:
         raise HTTPException(
@@ -197,6 +345,22 @@ async def submit_report(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="You are not authorized to submit a report for this ticket.",
         )
+    except AttachmentTooLargeException as e:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=str(e),
+        )
+    except StorageCapacityException as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e),
+            headers={"Retry-After": "5"},
+        )
+    except StorageTimeoutException as e:
+        raise HTTPException(
+            status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+            detail=str(e),
+        )
     except HTTPException as e:
         raise e
     except Exception as e:
@@ -225,7 +389,7 @@ async def get_ticket_report(
                 detail="Report not found.",
             )
 
-        return report
+        return MongoJSONResponse(report)
     except TicketNotFoundException as e:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -13,6 +13,7 @@ class ChatSession(BaseModel):
     ticket_id: Optional[str] = None
     messages: List[ChatMessage] = Field(default_factory=list)
     chat_history: List[Dict[str, str]] = Field(default_factory=list)  # Serialized chat history
+    turn: int = 0  # Incremented on every persisted turn; used for optimistic concurrency
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
 
@@ -22,6 +23,7 @@ class ChatResponse(BaseModel):
     ticket_id: Optional[str] = None
     messages: List[ChatMessage] = Field(default_factory=list)
     chat_history: List[Dict[str, str]] = Field(default_factory=list)  # Serialized chat history
+    turn: int = 0
     created_at: datetime 
     updated_at: datetime 
 
@@ -39,4 +41,13 @@ class ChatList(BaseModel):
     user_id: str
     ticket_id: Optional[str] = None
     created_at: datetime
-    updated_at: datetime
\ No newline at end of file
+    updated_at: datetime
+    message_count: int = 0
+    last_message: Optional[str] = None  # Preview of the newest message, truncated server-side
+    last_message_at: Optional[datetime] = None
+
+
+class ChatMessagePage(BaseModel):
+    session_id: str
+    messages: List[ChatMessage] = Field(default_factory=list)  # Oldest first within the page
+    before: Optional[int] = None  # Pass as `before` to fetch the next older page; None on the oldest page
\ No newline at end of file
@@ -1,5 +1,6 @@
+from datetime import datetime
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import Dict, Literal, Optional
 
 class TicketCreate(BaseModel):
     title: str = Field(..., description="Title of the ticket")
@@ -7,4 +8,20 @@ class TicketCreate(BaseModel):
     bp: Optional[str] = Field(None, description="Blood pressure (e.g., 140/90)")
     sugar_level: Optional[str] = Field(None, description="Sugar level (e.g., 120)")
     weight: Optional[float] = Field(None, description="Weight in kilograms")
-    symptoms: Optional[str] = Field(None, description="Symptoms experienced by the patient")
\ No newline at end of file
+    symptoms: Optional[str] = Field(None, description="Symptoms experienced by the patient")
+
+class AttachmentUploadRequest(BaseModel):
+    file_type: Literal["images", "docs"] = Field(..., description="Attachment slot: 'images' or 'docs'")
+    filename: str = Field(..., description="Original file name, used for the extension")
+    content_type: str = Field("application/octet-stream", description="MIME type the file will be uploaded with")
+
+class AttachmentUploadResponse(BaseModel):
+    path: str = Field(..., description="Storage path to pass to the confirm call")
+    upload_url: str = Field(..., description="Short-lived URL to upload the file to")
+    method: str = Field(..., description="HTTP method to use for the upload")
+    headers: Dict[str, str] = Field(..., description="Headers the upload request must send")
+    expires_at: datetime = Field(..., description="When the upload URL stops working")
+
+class AttachmentConfirmRequest(BaseModel):
+    file_type: Literal["images", "docs"] = Field(..., description="Attachment slot: 'images' or 'docs'")
+    path: str = Field(..., description="Storage path returned when the upload URL was issued")
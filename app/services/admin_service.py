@@ -1,7 +1,7 @@
 from app.repositories.user_repository import UserRepository
 from app.services.notification_service import NotificationService
 from app.core.exceptions import UserNotFoundException
-from app.utils.mongo_utils import convert_objectids_to_strings
+from app.core.cache import invalidate_user
 
 class AdminService:
     def __init__(
@@ -16,37 +16,36 @@ class AdminService:
         """
         Update a user's status to 'accepted' or 'rejected' and notify the user.
         """
-        user = await self.user_repository.get_user_by_id(user_id)
-        if not user:
-            raise UserNotFoundException("User not found")
-
-        # Update the user's status
+        # Update the user's status, getting the updated document back in the same round trip
         updated_user = await self.user_repository.update_user(user_id, {"status": status})
         if not updated_user:
-            raise UserNotFoundException("Failed to update user status")
+            raise UserNotFoundException("User not found")
+
+        # A rejected user must be locked out immediately, not after the cache TTL
+        invalidate_user(user_id)
 
         # Notify the user
-        if user.get("fcm_token"):
+        if updated_user.get("fcm_token"):
             message = f"Your registration has been {status}."
             await self.notification_service.create_notification(
-                user_id=user["_id"],
+                user_id=updated_user["_id"],
                 message=message,
                 type=f"registration_{status}",  # e.g., "registration_accepted"
-                fcm_token=user["fcm_token"],
+                fcm_token=updated_user["fcm_token"],
             )
 
-        return convert_objectids_to_strings(updated_user)
+        return updated_user
 
     async def get_all_patients(self):
         """
         Fetch all users with role 'patient' and status 'accepted'.
         """
         patients = await self.user_repository.get_users_by_role_and_status("patient", "accepted")
-        return convert_objectids_to_strings(patients)
+        return patients
 
     async def get_all_doctors(self):
         """
         Fetch all users with role 'doctor' and status 'accepted'.
         """
         doctors = await self.user_repository.get_users_by_role_and_status("doctor", "accepted")
-        return convert_objectids_to_strings(doctors)
\ No newline at end of file
+        return doctors
\ No newline at end of file
@@ -1,5 +1,5 @@
 from datetime import timedelta
-from app.core.security import verify_password, create_access_token
+from app.core.security import verify_password_async, create_access_token
 from app.services.user_service import UserService
 from app.core.exceptions import InvalidCredentialsException, UserNotFoundException
 from app.schemas.token_schemas import Token
@@ -19,7 +19,7 @@ class AuthService:
             # Raise a generic error to avoid revealing whether the username exists
             raise InvalidCredentialsException("Invalid email or password")
 
-        if not verify_password(password, user["hashed_password"]):
+        if not await verify_password_async(password, user["hashed_password"]):
             raise InvalidCredentialsException("Invalid email or password")
 
         access_token_expires = timedelta(minutes=525960)
@@ -2,30 +2,36 @@ import aiohttp
 from io import BytesIO
 import PIL.Image
 from datetime import datetime
-from typing import Dict, List, Optional
+from typing import BinaryIO, Dict, List, Optional, Tuple
 import uuid
 from fastapi import HTTPException
 import google.generativeai as genai
 import fitz  
-from app.core.config import settings
+from app.core.config import IMAGE_MODEL_SIZE, MAX_ATTACHMENT_BYTES, settings
+from app.core.exceptions import AttachmentTooLargeException
+from app.core.images import render_image_variants
+from app.core.uploads import mapped_file, spool_chunks, worker_file
 from app.repositories.chat_repository import ChatRepository
-from app.schemas.chat_schemas import ChatSession, ChatMessage
+from app.schemas.chat_schemas import ChatList, ChatMessagePage, ChatSession, ChatMessage
 from app.services.ticket_service import TicketService
 from app.services.user_service import UserService
+from app.utils.pagination import DEFAULT_PAGE_SIZE
 
 # Configure Gemini
 genai.configure(api_key=settings.GEMINI_API_KEY)
 model = genai.GenerativeModel('gemini-1.5-flash')
 
-async def fetch_file_from_url(url: str) -> bytes:
+async def fetch_file_from_url(url: str) -> BinaryIO:
     """
-    Fetch a file from a public URL and return its bytes.
+    Stream a file from a public URL into a spooled temporary file; the caller closes it.
     """
     async with aiohttp.ClientSession() as session:
         async with session.get(url) as response:
-            if response.status == 200:
-                return await response.read()
-            raise HTTPException(status_code=404, detail=f"Could not fetch file from {url}")
+            if response.status != 200:
+                raise HTTPException(status_code=404, detail=f"Could not fetch file from {url}")
+            if response.content_length is not None and response.content_length > MAX_ATTACHMENT_BYTES:
+                raise AttachmentTooLargeException(f"File at {url} is too large")
+            return await spool_chunks(response.content.iter_chunked(256 * 1024))
 
 class ChatService:
     def __init__(self, chat_repository: ChatRepository, user_service: UserService, ticket_service: TicketService):
@@ -33,6 +39,31 @@ class ChatService:
         self.user_service = user_service
         self.ticket_service = ticket_service
 
+    async def _fetch_ticket_file(self, url: str) -> BinaryIO:
+        """
+        Open a ticket attachment from storage, or over HTTP if the URL points elsewhere; the caller closes it.
+        """
+        file = await self.ticket_service.open_attachment(url)
+        if file is None:
+            file = await fetch_file_from_url(url)
+        return file
+
+    async def _ticket_document_text(self, url: str) -> Optional[str]:
+        """
+        Text of a ticket's document, from the cache kept per stored content when available.
+        """
+        text = await self.ticket_service.get_document_text(url)
+        if text is not None:
+            return text
+        document = await self._fetch_ticket_file(url)
+        try:
+            text = await self._process_document(document)
+        finally:
+            document.close()
+        if text:
+            await self.ticket_service.cache_document_text(url, text)
+        return text
+
     async def _format_context_prompt(self, current_user: dict, user_id: str, ticket_id: Optional[str] = None) -> str:
         """
         Format a clear context prompt combining ticket and patient data when appropriate.
@@ -102,36 +133,42 @@ class ChatService:
 
         return "\n".join(prompt_parts)
 
-    async def _process_image(self, image: Optional[bytes]) -> Optional[PIL.Image.Image]:
+    async def _process_image(self, image: Optional[BinaryIO]) -> Optional[PIL.Image.Image]:
         """
-        Process an image from bytes.
+        Open an image from a file, downscaled to the "model" variant size if it is larger.
+        - Downscaling runs on the image process pool; if that fails the original is used.
         """
         if not image:
             return None
 
         try:
-            img = PIL.Image.open(BytesIO(image))
-            return img
+            image.seek(0)
+            img = PIL.Image.open(image)
+            if max(img.size) <= IMAGE_MODEL_SIZE:
+                return img
+            try:
+                async with worker_file(image) as source:
+                    rendered = await render_image_variants(source, ("model",))
+                return PIL.Image.open(BytesIO(rendered["model"]))
+            except Exception as e:
+                print(f"Error downscaling image, using the original: {str(e)}")
+                image.seek(0)
+                return PIL.Image.open(image)
         except Exception as e:
             print(f"Error processing image: {str(e)}")
             return None
 
-    async def _process_document(self, document: Optional[bytes]) -> Optional[str]:
+    async def _process_document(self, document: Optional[BinaryIO]) -> Optional[str]:
         """
-        Process a document from bytes.
+        Extract the text of a PDF document from a file, memory-mapping it when it is on disk.
         """
         if not document:
             return None
 
         try:
-            if isinstance(document, bytes):
-                doc = fitz.open(stream=document, filetype="pdf")
-                text_content = ""
-                for page in doc:
-                    text_content += page.get_text()
-                return text_content
-            else:
-                return document.decode('utf-8', errors='ignore')
+            with mapped_file(document) as buffer:
+                with fitz.open(stream=buffer, filetype="pdf") as doc:
+                    return "".join(page.get_text() for page in doc)
         except Exception as e:
             print(f"Error processing document: {str(e)}")
             return None
@@ -142,8 +179,8 @@ class ChatService:
         user_id: str,
         ticket_id: Optional[str] = None,
         message: Optional[str] = None,
-        image: Optional[bytes] = None,
-        document: Optional[bytes] = None,
+        image: Optional[BinaryIO] = None,
+        document: Optional[BinaryIO] = None,
     ) -> ChatSession:
         # Fetch previous chat history if this is a continuation of an existing session
         previous_history = []
@@ -153,59 +190,68 @@ class ChatService:
         #         previous_history.extend(chat.chat_history)
 
         # If ticket_id is provided, fetch the ticket and process its image_url and docs_url
+        fetched_files = []
+        document_text = None
         if ticket_id:
             ticket = await self.ticket_service.get_ticket_by_id(ticket_id, current_user)
             if ticket:
-                # Fetch and process image from ticket's image_url
-                if ticket.get("image_url"):
+                # Fetch and process the ticket's image, preferring its model-sized variant
+                image_url = (ticket.get("image_variants") or {}).get("model") or ticket.get("image_url")
+                if image_url:
                     try:
-                        image = await fetch_file_from_url(ticket["image_url"])
+                        image = await self._fetch_ticket_file(image_url)
+                        fetched_files.append(image)
                     except Exception as e:
                         print(f"Error fetching image from URL: {str(e)}")
 
-                # Fetch and process document from ticket's docs_url
+                # Use the ticket document's text, extracting and caching it by content on first use
                 if ticket.get("docs_url"):
                     try:
-                        document = await fetch_file_from_url(ticket["docs_url"])
+                        document_text = await self._ticket_document_text(ticket["docs_url"])
                     except Exception as e:
                         print(f"Error fetching document from URL: {str(e)}")
 
-        # Start a new Gemini chat session with previous history
-        chat = model.start_chat(history=previous_history)
-
-        # Get formatted context
-        context_prompt = await self._format_context_prompt(current_user, user_id, ticket_id)
-
-        # Prepare input content
-        input_content = [context_prompt]
-
-        if message:
-            input_content.append(f"User Query: {message}")
-
-        if image:
-            img = await self._process_image(image)
-            if img:
-                input_content.append(img)
-
-        if document:
-            doc_text = await self._process_document(document)
-            if doc_text:
-                input_content.append(f"Document content: {doc_text}")
-
-        # Add the system prompt
-        system_prompt = (
-            "\nSYSTEM INSTRUCTIONS:\n"
-            "You are the NexGenHealth AI Assistant, designed to provide medical information and support. "
-            "This is an educational project and not for real medical use. "
-            "Provide concise, informative responses in 6-8 lines. "
-            "Base your responses on the provided patient data and ticket details. "
-            "Be direct and avoid unnecessary medical disclaimers since this is a project. "
-            "Maintain a professional yet approachable tone."
-        )
-        input_content.append(system_prompt)
-
-        # Send input to the model
-        response = chat.send_message(input_content)
+        try:
+            # Start a new Gemini chat session with previous history
+            chat = model.start_chat(history=previous_history)
+
+            # Get formatted context
+            context_prompt = await self._format_context_prompt(current_user, user_id, ticket_id)
+
+            # Prepare input content
+            input_content = [context_prompt]
+
+            if message:
+                input_content.append(f"User Query: {message}")
+
+            if image:
+                img = await self._process_image(image)
+                if img:
+                    input_content.append(img)
+
+            if document_text is None and document:
+                document_text = await self._process_document(document)
+            if document_text:
+                input_content.append(f"Document content: {document_text}")
+
+            # Add the system prompt
+            system_prompt = (
+                "\nSYSTEM INSTRUCTIONS:\n"
+                "You are the NexGenHealth AI Assistant, designed to provide medical information and support. "
+                "This is an educational project and not for real medical use. "
+                "Provide concise, informative responses in 6-8 lines. "
+                "Base your responses on the provided patient data and ticket details. "
+                "Be direct and avoid unnecessary medical disclaimers since this is a project. "
+                "Maintain a professional yet approachable tone."
+            )
+            input_content.append(system_prompt)
+
+            # Send input to the model
+            response = chat.send_message(input_content)
+        finally:
+            # Files fetched for the ticket are spooled copies owned by this call
+            for file in fetched_files:
+                file.close()
 
         # Serialize the Gemini chat history
         serialized_history = [
@@ -234,11 +280,17 @@ class ChatService:
         self,
         session_id: str,
         message: str,
-        image: Optional[bytes] = None,
-        document: Optional[bytes] = None,
+        image: Optional[BinaryIO] = None,
+        document: Optional[BinaryIO] = None,
     ) -> ChatSession:
-        # Fetch the chat session
-        chat_session = await self.chat_repository.get_chat_session(session_id)
+        """
+        Send one message in an existing session and persist the turn.
+        - Only the opening turn and the newest buckets are loaded and replayed to the model, so a
+          turn costs the same however long the session is; the returned session carries those
+          recent messages, and older ones are paged through get_chat_messages.
+        """
+        # Fetch what the next turn needs from the chat session
+        chat_session = await self.chat_repository.get_chat_context(session_id)
         if not chat_session:
             raise HTTPException(status_code=404, detail="Session not found")
 
@@ -275,31 +327,47 @@ class ChatService:
         # Send input to the model
         response = chat.send_message(input_content)
 
-        # Update the chat session
-        chat_session.messages.extend([
+        # Only the entries produced by this turn are persisted
+        new_messages = [
             ChatMessage(sender="user", text=message, timestamp=datetime.utcnow()),
             ChatMessage(sender="bot", text=response.text, timestamp=datetime.utcnow()),
-        ])
-        chat_session.chat_history = [
-            {"role": msg.role, "text": msg.parts[0].text}  # Serialize updated history
-            for msg in chat.history
         ]
-        chat_session.updated_at = datetime.utcnow()
+        new_history = [
+            {"role": msg.role, "text": msg.parts[0].text}  # Serialize the new history entries
+            for msg in chat.history[len(deserialized_history):]
+        ]
+        updated_at = datetime.utcnow()
+
+        # Append the turn; fails with ChatSessionConflictException if another turn landed first
+        await self.chat_repository.append_chat_turn(
+            session_id=session_id,
+            expected_turn=chat_session.turn,
+            messages=new_messages,
+            history_entries=new_history,
+            updated_at=updated_at,
+        )
 
-        # Save the updated chat session
-        await self.chat_repository.update_chat_session(chat_session)
+        chat_session.messages.extend(new_messages)
+        chat_session.chat_history.extend(new_history)
+        chat_session.turn += 1
+        chat_session.updated_at = updated_at
 
         return chat_session
     
     async def get_chats_by_user_and_ticket(
-        self, user_id: str, ticket_id: Optional[str] = None
-    ) -> List[ChatSession]:
+        self,
+        user_id: str,
+        ticket_id: Optional[str] = None,
+        limit: int = DEFAULT_PAGE_SIZE,
+        cursor: Optional[str] = None,
+    ) -> Tuple[List[ChatList], Optional[str]]:
         """
-        Retrieve all chat sessions for a specific user.
+        Retrieve one page of chat session summaries for a specific user.
         - If `ticket_id` is provided, filter chats by both `user_id` and `ticket_id`.
         - If `ticket_id` is not provided, return all chats for the `user_id`.
+        - Returns the summaries (newest first) and the cursor for the next page.
         """
-        return await self.chat_repository.get_chats_by_user_and_ticket(user_id, ticket_id)
+        return await self.chat_repository.get_chats_by_user_and_ticket(user_id, ticket_id, limit, cursor)
 
     async def end_chat(self, session_id: str):
         """
@@ -311,6 +379,16 @@ class ChatService:
         await self.chat_repository.delete_chat_session(session_id)
 
 
+    async def get_chat_messages(self, session_id: str, before: Optional[int] = None) -> ChatMessagePage:
+        """
+        Retrieve one page of a session's messages, newest page first.
+        """
+        page = await self.chat_repository.get_message_page(session_id, before)
+        if page is None:
+            raise HTTPException(status_code=404, detail="Chat session not found")
+        messages, next_before = page
+        return ChatMessagePage(session_id=session_id, messages=messages, before=next_before)
+
     async def get_chat_session(self, session_id: str) -> Optional[ChatSession]:
         """
         Retrieve a specific chat session by its session_id.
@@ -0,0 +1,159 @@
+import asyncio
+import hashlib
+import os
+from typing import BinaryIO, Dict, Optional, Tuple
+from pymongo.errors import DuplicateKeyError
+from app.core.config import MAX_ATTACHMENT_BYTES
+from app.core.exceptions import AttachmentTooLargeException, StorageCapacityException
+from app.core.storage import StorageBackend, storage
+from app.repositories.stored_file_repository import StoredFileRepository
+
+HASH_CHUNK_SIZE = 1024 * 1024
+# Extracted text larger than this is not cached (documents have a 16MB limit)
+MAX_CACHED_TEXT_CHARS = 1_000_000
+# How long an upload waits for a delete of the same content to finish
+DELETE_WAIT_ATTEMPTS = 5
+# A delete running longer than this is presumed abandoned and is taken over by the next upload
+STALE_DELETE_SECONDS = 10 * 60
+
+
+def _hash_file(file: BinaryIO, max_bytes: int) -> Tuple[str, int]:
+    """
+    SHA-256 and size of a file, read in chunks from the start (blocking).
+    """
+    digest = hashlib.sha256()
+    size = 0
+    file.seek(0)
+    while True:
+        chunk = file.read(HASH_CHUNK_SIZE)
+        if not chunk:
+            break
+        size += len(chunk)
+        if size > max_bytes:
+            raise AttachmentTooLargeException("Attachment is too large")
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest(), size
+
+
+class FileStore:
+    """
+    Content-addressed attachments on top of a StorageBackend.
+    - Objects are named by the SHA-256 of their content, so an upload whose content is
+      already stored reuses that object instead of storing it again.
+    - `stored_files` records who references each object (a holder such as
+      "<ticket_id>:image_url"); releasing the last reference deletes the object and its
+      derivatives, and releasing a reference the holder never took does nothing.
+    - Image variants and extracted document text are cached per content hash.
+    """
+
+    def __init__(self, storage: StorageBackend, stored_file_repository: StoredFileRepository):
+        self.storage = storage
+        self.stored_file_repository = stored_file_repository
+        self.uploads = 0
+        self.deduplicated = 0
+        self.bytes_deduplicated = 0
+        self.deleted = 0
+
+    async def put(
+        self, file: BinaryIO, filename: str, content_type: str, holder: str, max_bytes: int = MAX_ATTACHMENT_BYTES
+    ) -> str:
+        """
+        Store a file (or reuse the stored copy of the same content) and record `holder` as referencing it.
+        - Returns the object's storage path.
+        """
+        content_hash, size = await asyncio.to_thread(_hash_file, file, max_bytes)
+        path = f"files/{content_hash}{os.path.splitext(filename or '')[1].lower()}"
+
+        for attempt in range(DELETE_WAIT_ATTEMPTS):
+            try:
+                existing = await self.stored_file_repository.acquire(content_hash, path, size, content_type, holder)
+                break
+            except DuplicateKeyError:
+                # The last reference to this content was just released; wait for its delete to
+                # finish, or take it over if its process died part way through
+                if not await self.stored_file_repository.take_over_deletion(content_hash, STALE_DELETE_SECONDS):
+                    await asyncio.sleep(0.05 * (attempt + 1))
+        else:
+            raise StorageCapacityException("File is being replaced, please retry shortly")
+
+        self.uploads += 1
+        if existing is not None:
+            path = existing["path"]
+            if existing["status"] == "stored":
+                self.deduplicated += 1
+                self.bytes_deduplicated += size
+                return path
+
+        # New content, or a concurrent first upload that has not finished; the same bytes go to the same path
+        try:
+            await self.storage.put(path, file, content_type)
+        except BaseException:
+            if existing is None or holder not in existing.get("refs", ()):
+                await self._release(content_hash, holder)
+            raise
+        await self.stored_file_repository.mark_stored(content_hash)
+        return path
+
+    async def release(self, path: str, holder: str):
+        """
+        Drop the reference `holder` took by put; paths that are not content-addressed, or that
+        the holder does not reference, are ignored.
+        """
+        record = await self.stored_file_repository.find_by_path(path)
+        if record is not None:
+            await self._release(record["_id"], holder)
+
+    async def _release(self, content_hash: str, holder: str):
+        record = await self.stored_file_repository.release(content_hash, holder)
+        if record is None or record["refs"]:
+            return
+        record = await self.stored_file_repository.claim_for_deletion(content_hash)
+        if record is None:
+            return
+        paths = [record["path"], *(record.get("variants") or {}).values()]
+        try:
+            await asyncio.gather(*(self.storage.delete(path) for path in paths))
+        except Exception as e:
+            print(f"Failed to delete stored file {content_hash}: {e}")
+            await self.stored_file_repository.restore(content_hash)
+            return
+        await self.stored_file_repository.delete(content_hash)
+        self.deleted += 1
+
+    async def get_variants(self, path: str) -> Optional[Dict[str, str]]:
+        """
+        Cached derivative paths for the content stored at `path`, if any.
+        """
+        record = await self.stored_file_repository.find_by_path(path)
+        return record.get("variants") if record else None
+
+    async def set_variants(self, path: str, variants: Dict[str, str]):
+        record = await self.stored_file_repository.find_by_path(path)
+        if record is not None:
+            await self.stored_file_repository.set_variants(record["_id"], variants)
+
+    async def get_text(self, path: str) -> Optional[str]:
+        """
+        Cached extracted text for the content stored at `path`, if any.
+        """
+        record = await self.stored_file_repository.find_by_path(path)
+        return record.get("text") if record else None
+
+    async def set_text(self, path: str, text: str):
+        if len(text) > MAX_CACHED_TEXT_CHARS:
+            return
+        record = await self.stored_file_repository.find_by_path(path)
+        if record is not None:
+            await self.stored_file_repository.set_text(record["_id"], text)
+
+    def stats(self) -> dict:
+        return {
+            "uploads": self.uploads,
+            "deduplicated": self.deduplicated,
+            "bytes_deduplicated": self.bytes_deduplicated,
+            "deleted": self.deleted,
+        }
+
+
+file_store = FileStore(storage, StoredFileRepository())
@@ -0,0 +1,152 @@
+import asyncio
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+import bson
+from app.core.config import (
+    NOTIFICATION_ARCHIVE_ENABLED,
+    NOTIFICATION_COMPACT_AFTER_DAYS,
+    NOTIFICATION_COMPACTION_BATCH_SIZE,
+    NOTIFICATION_COMPACTION_INTERVAL_SECONDS,
+)
+from app.repositories.notification_retention_repository import NotificationRetentionRepository
+
+LOCK_NAME = "notification_compaction"
+# Renewed after every batch, so a crashed run only holds compaction back for this long
+LEASE_SECONDS = 300
+
+
+class NotificationCompactor:
+    """
+    Periodically rolls read notifications older than `compact_after_days` into per-user
+    monthly summaries, optionally archives them, and deletes them from `notifications`.
+    - Only one run compacts at a time: runs in this process are serialised, and each run
+      holds a lease in `job_locks` under its own owner token.
+    - Each batch is stamped with a batch id before it is summarised, and a summary records
+      the batches it holds, so re-running a batch interrupted before its delete adds it once.
+    - Read notifications that are never compacted still expire through the TTL index on
+      `read_at` (NOTIFICATION_RETENTION_DAYS, kept well past `compact_after_days`); those
+      are not in the rollups.
+    """
+
+    def __init__(
+        self,
+        retention_repository: NotificationRetentionRepository,
+        compact_after_days: int = NOTIFICATION_COMPACT_AFTER_DAYS,
+        interval: float = NOTIFICATION_COMPACTION_INTERVAL_SECONDS,
+        batch_size: int = NOTIFICATION_COMPACTION_BATCH_SIZE,
+        archive: bool = NOTIFICATION_ARCHIVE_ENABLED,
+    ):
+        self.retention_repository = retention_repository
+        self.compact_after_days = compact_after_days
+        self.interval = interval
+        self.batch_size = batch_size
+        self.archive = archive
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._task: Optional[asyncio.Task] = None
+        self._run_lock = asyncio.Lock()
+        self.runs = 0
+        self.documents_reclaimed = 0
+        self.bytes_reclaimed = 0
+        self.last_run: Optional[Dict] = None
+
+    def start(self):
+        """
+        Start the periodic job on the running event loop (idempotent).
+        """
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is None or self._task.done():
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+    async def _run(self):
+        while True:
+            try:
+                await self.run_once()
+            except Exception as e:
+                print(f"Notification compaction failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def run_once(self) -> Optional[Dict]:
+        """
+        Compact everything that is due. Returns this run's report, or None if another run
+        (here or in another process) is compacting.
+        """
+        if self._run_lock.locked():
+            return None
+        async with self._run_lock:
+            return await self._compact()
+
+    async def _compact(self) -> Optional[Dict]:
+        # A token per run, so the scheduled run and an admin-triggered one never share a lease
+        owner = f"{self.owner}:{uuid.uuid4().hex}"
+        if not await self.retention_repository.acquire_lock(LOCK_NAME, owner, LEASE_SECONDS):
+            return None
+
+        started_at = datetime.utcnow()
+        cutoff = started_at - timedelta(days=self.compact_after_days)
+        report = {"started_at": started_at, "cutoff": cutoff, "documents": 0, "bytes": 0, "rollup_updates": 0}
+        try:
+            last_id = None
+            while True:
+                batch = await self.retention_repository.find_compactable(cutoff, last_id, self.batch_size)
+                if not batch:
+                    break
+                last_id = batch[-1]["_id"]
+
+                batch = await self.retention_repository.claim_batch(
+                    [notification["_id"] for notification in batch], uuid.uuid4().hex
+                )
+
+                # Grouped by batch id: an interrupted run's leftovers keep the id they were counted under
+                rollups: Dict[str, Dict[tuple, Dict[str, int]]] = {}
+                for notification in batch:
+                    key = (notification["user_id"], notification["_id"].generation_time.strftime("%Y-%m"))
+                    by_type = rollups.setdefault(notification["compaction_batch"], {}).setdefault(key, {})
+                    type = notification.get("type") or "unknown"
+                    by_type[type] = by_type.get(type, 0) + 1
+                for batch_id, batch_rollups in rollups.items():
+                    await self.retention_repository.add_to_rollups(batch_rollups, batch_id)
+                if self.archive:
+                    await self.retention_repository.archive(batch, started_at)
+                deleted = set(await self.retention_repository.delete([notification["_id"] for notification in batch]))
+
+                report["documents"] += len(deleted)
+                report["bytes"] += sum(
+                    len(bson.encode(notification)) for notification in batch if notification["_id"] in deleted
+                )
+                report["rollup_updates"] += sum(len(batch_rollups) for batch_rollups in rollups.values())
+                if not await self.retention_repository.acquire_lock(LOCK_NAME, owner, LEASE_SECONDS):
+                    # The lease expired and another run took over; leave the rest to it
+                    break
+        finally:
+            await self.retention_repository.release_lock(LOCK_NAME, owner)
+
+        report["finished_at"] = datetime.utcnow()
+        self.runs += 1
+        self.documents_reclaimed += report["documents"]
+        self.bytes_reclaimed += report["bytes"]
+        self.last_run = report
+        return report
+
+    def stats(self) -> dict:
+        return {
+            "compact_after_days": self.compact_after_days,
+            "archive": self.archive,
+            "runs": self.runs,
+            "documents_reclaimed": self.documents_reclaimed,
+            "bytes_reclaimed": self.bytes_reclaimed,
+            "last_run": self.last_run,
+        }
+
+
+notification_compactor = NotificationCompactor(NotificationRetentionRepository())
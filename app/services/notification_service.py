@@ -1,47 +1,109 @@
 from app.repositories.notification_repository import NotificationRepository
-from app.core.firebase import messaging
+from app.repositories.outbox_repository import OutboxRepository
+from typing import List, Optional, Tuple
+from bson import ObjectId
+from app.core.firebase import build_fcm_message
+from app.core.push_dispatcher import push_dispatcher
 from datetime import datetime
-from app.core.exceptions import NotificationException
-from app.utils.mongo_utils import convert_objectids_to_strings
+from app.core.exceptions import NotificationException, NotificationNotFoundException
+from app.core.config import NOTIFICATION_DIGEST_WINDOW_SECONDS
+from app.services.outbox_worker import outbox_worker
+from app.utils.pagination import DEFAULT_PAGE_SIZE
+
+# Broadcast types that are coalesced into digests, with the summary used for a digest of
+# several events; `{count}` and `{window}` are filled in when it is delivered and created.
+DIGEST_MESSAGES = {
+    "ticket_created": "{count} new tickets in the last {window}",
+    "user_registered": "{count} new users registered in the last {window}",
+}
+
+
+def _describe_window(seconds: float) -> str:
+    if seconds >= 3600 and seconds % 3600 == 0:
+        hours = int(seconds // 3600)
+        return "hour" if hours == 1 else f"{hours} hours"
+    if seconds >= 60 and seconds % 60 == 0:
+        minutes = int(seconds // 60)
+        return "minute" if minutes == 1 else f"{minutes} minutes"
+    return f"{seconds:g} seconds"
 
 class NotificationService:
-    def __init__(self, notification_repository: NotificationRepository):
+    def __init__(self, notification_repository: NotificationRepository, outbox_repository: OutboxRepository):
         self.notification_repository = notification_repository
+        self.outbox_repository = outbox_repository
 
     async def create_notification(self, user_id: str,  message: str, type: str, fcm_token: str = None):
-        # Store notification in the database
-        notification_data = {
-            "user_id": user_id,
-            "message": message,
-            "type": type,
-            "created_at": datetime.utcnow(),
-            "read": False,
-        }
-        await self.notification_repository.create_notification(notification_data)
-
-        # Send push notification via FCM
-        if fcm_token:
-            await self.send_fcm_notification(fcm_token, message, type)
+        """
+        Record a notification in the outbox and return immediately.
+        - The outbox worker stores it for the user and sends the push in the background.
+        """
+        entry = self.outbox_repository.new_entry(user_id, message, type, fcm_token, datetime.utcnow())
+        await self.outbox_repository.add_entries([entry])
+        outbox_worker.wake()
 
-    async def send_fcm_notification(self, fcm_token: str, message: str, type: str):
-        try:
-            message = messaging.Message(
-                notification=messaging.Notification(
-                    title=f"New {type.replace('_', ' ').title()}",  # Convert type to a readable title
-                    body=message,
+    async def notify_users(self, recipients: List[dict], message: str, type: str):
+        """
+        Notify several users at once, e.g. every admin.
+        - Only recipients with an FCM token are notified.
+        - Types listed in DIGEST_MESSAGES are coalesced: the first event is delivered right
+          away, and events within NOTIFICATION_DIGEST_WINDOW_SECONDS after it are delivered to
+          each recipient as a single digest notification and push.
+        """
+        created_at = datetime.utcnow()
+        recipients = [recipient for recipient in recipients if recipient.get("fcm_token")]
+        if NOTIFICATION_DIGEST_WINDOW_SECONDS > 0 and type in DIGEST_MESSAGES:
+            recipients = await self.outbox_repository.add_to_digests(
+                recipients,
+                type,
+                event={"message": message, "created_at": created_at},
+                # Substitute the window now; {count} is only known at delivery
+                digest_message=DIGEST_MESSAGES[type].replace(
+                    "{window}", _describe_window(NOTIFICATION_DIGEST_WINDOW_SECONDS)
                 ),
-                token=fcm_token,
+                window_seconds=NOTIFICATION_DIGEST_WINDOW_SECONDS,
+                now=created_at,
             )
-            response = messaging.send(message)
-            print("Successfully sent message:", response)
+            # Recipients whose digest this event opened get it now, not when the window closes
+
+        await self.outbox_repository.add_entries([
+            self.outbox_repository.new_entry(recipient["_id"], message, type, recipient["fcm_token"], created_at)
+            for recipient in recipients
+        ])
+        outbox_worker.wake()
+
+    async def send_fcm_notification(self, fcm_token: str, message: str, type: str):
+        """
+        Queue a push notification without recording it; it is sent in the background by the push dispatcher.
+        """
+        try:
+            message = build_fcm_message(fcm_token, message, type)
         except Exception as e:
-            raise NotificationException(f"Failed to send FCM notification: {e}")
+            raise NotificationException(f"Failed to build FCM notification: {e}")
+        push_dispatcher.enqueue(message)
+
+    async def get_notifications(
+        self,
+        user_id: str,
+        unread_only: bool = False,
+        limit: int = DEFAULT_PAGE_SIZE,
+        cursor: Optional[str] = None,
+    ) -> Tuple[List[dict], Optional[str]]:
+        """
+        Get one page of the user's notifications, newest first, and the cursor for the next page.
+        """
+        return await self.notification_repository.get_notifications_by_user(user_id, unread_only, limit, cursor)
+
+    async def get_unread_count(self, user_id: str) -> int:
+        return await self.notification_repository.get_unread_count(user_id)
 
-    async def get_notifications(self, user_id: str):
-        notifications = await self.notification_repository.get_notifications_by_user(user_id)
-        for notification in notifications:
-            convert_objectids_to_strings(notification)
-        return notifications
+    async def mark_as_read(self, user_id: str, notification_id: str):
+        """
+        Mark a single notification as read; marking an already read notification is a no-op.
+        """
+        if not ObjectId.is_valid(notification_id):
+            raise NotificationNotFoundException("Notification not found")
+        if await self.notification_repository.mark_as_read(user_id, notification_id) is None:
+            raise NotificationNotFoundException("Notification not found")
 
     async def mark_all_as_read(self, user_id: str):
         await self.notification_repository.mark_all_as_read(user_id)
\ No newline at end of file
@@ -0,0 +1,216 @@
+import asyncio
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+from app.core.config import (
+    OUTBOX_BACKOFF_BASE_SECONDS,
+    OUTBOX_BACKOFF_MAX_SECONDS,
+    OUTBOX_BATCH_SIZE,
+    OUTBOX_LEASE_SECONDS,
+    OUTBOX_MAX_ATTEMPTS,
+    OUTBOX_POLL_INTERVAL_SECONDS,
+)
+from app.core.exceptions import NotificationException
+from app.core.firebase import build_fcm_message
+from app.core.notification_hub import notification_hub
+from app.core.push_dispatcher import push_dispatcher
+from app.repositories.notification_repository import NotificationRepository
+from app.repositories.outbox_repository import OutboxRepository
+from app.repositories.user_repository import UserRepository
+
+
+class OutboxWorker:
+    """
+    Delivers notification outbox entries in the background.
+    - Each entry is stored in the notifications collection (idempotently, keyed by the
+      outbox _id), published to the user's live streams and, if the user has an FCM
+      token, pushed through the push dispatcher.
+    - Digest entries are delivered as one notification summarising the events that followed
+      the leading one (which was delivered on its own), with those events kept on the
+      notification document; a digest nothing followed is closed without a notification.
+    - Failed deliveries are retried with exponential backoff up to `max_attempts`; a push
+      rejected because the token is dead is not retried, and the token is cleared.
+    - Entries left "processing" by a previous process are reclaimed once their lease
+      expires, so pending work resumes after a restart.
+    """
+
+    def __init__(
+        self,
+        outbox_repository: OutboxRepository,
+        notification_repository: NotificationRepository,
+        user_repository: UserRepository,
+        batch_size: int = OUTBOX_BATCH_SIZE,
+        poll_interval: float = OUTBOX_POLL_INTERVAL_SECONDS,
+        max_attempts: int = OUTBOX_MAX_ATTEMPTS,
+        backoff_base: float = OUTBOX_BACKOFF_BASE_SECONDS,
+        backoff_max: float = OUTBOX_BACKOFF_MAX_SECONDS,
+        lease_seconds: float = OUTBOX_LEASE_SECONDS,
+    ):
+        self.outbox_repository = outbox_repository
+        self.notification_repository = notification_repository
+        self.user_repository = user_repository
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.lease_seconds = lease_seconds
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        self.delivered = 0
+        self.retried = 0
+        self.failed = 0
+        self.tokens_pruned = 0
+
+    def start(self):
+        """
+        Start the background loop on the running event loop (idempotent).
+        """
+        if self._task is None or self._task.done():
+            self._stopping = False
+            self._wake = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """
+        Finish the deliveries in progress and stop. Unclaimed entries stay pending in the outbox.
+        """
+        if self._task is None or self._task.done():
+            return
+        self._stopping = True
+        self._wake.set()
+        await self._task
+
+    def wake(self):
+        """
+        Tell the worker new entries are waiting so it does not sleep out the poll interval.
+        """
+        if self._wake is not None:
+            self._wake.set()
+
+    async def _run(self):
+        while not self._stopping:
+            self._wake.clear()
+            try:
+                entries = []
+                while len(entries) < self.batch_size:
+                    entry = await self.outbox_repository.claim_entry(self.worker_id, self.lease_seconds)
+                    if entry is None:
+                        break
+                    entries.append(entry)
+                if entries:
+                    dead_tokens = await asyncio.gather(*(self._deliver(entry) for entry in entries))
+                    await self._prune_tokens([pair for pair in dead_tokens if pair])
+                    continue
+            except Exception as e:
+                print(f"Notification outbox worker error: {e}")
+
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _deliver(self, entry: Dict) -> Optional[Tuple[Any, str]]:
+        """
+        Deliver one entry. Returns its (user_id, fcm_token) if FCM reported the token as dead.
+        """
+        dead_token = None
+        try:
+            if "events" in entry and not self._trailing_events(entry):
+                await self.outbox_repository.mark_delivered(entry)
+                return None
+            notification = {
+                "_id": entry["_id"],
+                "user_id": entry["user_id"],
+                "message": self._message(entry),
+                "type": entry["type"],
+                "created_at": entry["created_at"],
+                "read": False,
+            }
+            if "events" in entry:
+                # Digests keep the events they summarise alongside the summary
+                events = self._trailing_events(entry)
+                notification["count"] = len(events)
+                notification["events"] = events
+            if await self.notification_repository.create_notification_once(notification):
+                notification_hub.publish(entry["user_id"], notification)
+
+            if entry.get("fcm_token"):
+                result = push_dispatcher.enqueue(build_fcm_message(entry["fcm_token"], notification["message"], entry["type"]))
+                if result is None:
+                    raise NotificationException("Push queue is full")
+                try:
+                    # Bounded well inside the lease, so the entry is not reclaimed and pushed twice
+                    push = await asyncio.wait_for(result, self.lease_seconds / 2)
+                except asyncio.TimeoutError:
+                    raise NotificationException("Timed out waiting for the push to be sent")
+                if push.dead_token:
+                    # Retrying cannot help; the notification itself is stored, so this entry is done
+                    dead_token = (entry["user_id"], entry["fcm_token"])
+                elif not push.success:
+                    raise NotificationException(f"Failed to send FCM notification: {push.error}")
+
+            await self.outbox_repository.mark_delivered(entry)
+            self.delivered += 1
+        except Exception as e:
+            await self._handle_failure(entry, e)
+        return dead_token
+
+    async def _prune_tokens(self, dead_tokens: List[Tuple[Any, str]]):
+        """
+        Clear tokens FCM rejected as dead from their users and from pending entries, so
+        later fan-outs skip those users instead of paying for another failed send.
+        """
+        if not dead_tokens:
+            return
+        try:
+            self.tokens_pruned += await self.user_repository.clear_fcm_tokens(dead_tokens)
+            await self.outbox_repository.drop_tokens([token for _, token in dead_tokens])
+        except Exception as e:
+            print(f"Failed to prune dead FCM tokens: {e}")
+
+    @staticmethod
+    def _message(entry: Dict) -> str:
+        if "events" not in entry:
+            return entry["message"]
+        events = OutboxWorker._trailing_events(entry)
+        # A digest that only caught one event reads like a plain notification
+        if len(events) == 1:
+            return events[0]["message"]
+        return entry["digest_message"].format(count=len(events))
+
+    @staticmethod
+    def _trailing_events(entry: Dict) -> List[Dict]:
+        # The events a digest summarises, after the ones already delivered when it opened
+        return entry["events"][entry.get("leading_events", 0):]
+
+    async def _handle_failure(self, entry: Dict, error: Exception):
+        attempts = entry.get("attempts", 0) + 1
+        if attempts >= self.max_attempts:
+            self.failed += 1
+            print(f"Giving up on notification {entry['_id']} after {attempts} attempts: {error}")
+            await self.outbox_repository.mark_failed(entry, attempts, str(error))
+            return
+
+        delay = min(self.backoff_max, self.backoff_base * 2 ** (attempts - 1))
+        self.retried += 1
+        await self.outbox_repository.mark_retry(
+            entry, attempts, datetime.utcnow() + timedelta(seconds=delay), str(error)
+        )
+
+    def stats(self) -> dict:
+        return {
+            "worker_id": self.worker_id,
+            "running": self._task is not None and not self._task.done(),
+            "delivered": self.delivered,
+            "retried": self.retried,
+            "failed": self.failed,
+            "tokens_pruned": self.tokens_pruned,
+        }
+
+
+outbox_worker = OutboxWorker(OutboxRepository(), NotificationRepository(), UserRepository())
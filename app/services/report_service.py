@@ -5,7 +5,6 @@ from app.repositories.ticket_repository import TicketRepository
 from app.repositories.user_repository import UserRepository
 from app.services.notification_service import NotificationService
 from typing import Optional, Dict
-from app.utils.mongo_utils import convert_objectids_to_strings
 
 class ReportService:
     def __init__(
@@ -59,13 +58,10 @@ class ReportService:
                 fcm_token=patient["fcm_token"],
             )
 
-        return convert_objectids_to_strings(report)
+        return report
 
     async def get_report_by_ticket_id(self, ticket_id: str) -> Optional[Dict]:
         """
         Retrieve a report by ticket_id.
         """
-        report = await self.report_repository.get_report_by_ticket_id(ticket_id)
-        if report:
-            report = convert_objectids_to_strings(report)  
-        return report
\ No newline at end of file
+        return await self.report_repository.get_report_by_ticket_id(ticket_id)
\ No newline at end of file
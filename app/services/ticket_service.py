@@ -1,40 +1,99 @@
-from typing import Optional
+import asyncio
+import io
+import mimetypes
+import os
+import uuid
+from datetime import datetime
+from typing import BinaryIO, Dict, List, Optional, Set, Tuple
 from bson import ObjectId
 from fastapi import UploadFile
-from app.core.google_cloud import download_file_from_gcs, upload_report_file_to_gcs, upload_ticket_to_gcs
 from app.repositories.ticket_repository import TicketRepository
+from app.services.file_store import FileStore
 from app.services.notification_service import NotificationService
 from app.repositories.user_repository import UserRepository
-from app.core.exceptions import TicketNotFoundException, UnauthorizedAccessException
-from app.utils.mongo_utils import convert_objectids_to_strings
-from app.core.config import settings
+from app.core.exceptions import (
+    AttachmentNotFoundException,
+    AttachmentTooLargeException,
+    InvalidAttachmentException,
+    StorageCapacityException,
+    StorageTimeoutException,
+    TicketNotFoundException,
+    UnauthorizedAccessException,
+)
+from app.utils.pagination import DEFAULT_PAGE_SIZE
+from app.core.config import MAX_ATTACHMENT_BYTES
+from app.core.images import IMAGE_VARIANTS, VARIANT_CONTENT_TYPE, VARIANT_EXTENSION, render_image_variants
+from app.core.storage import StorageBackend, UploadTarget
+from app.core.uploads import attachment_file, spool_chunks, worker_file
+
+# Ticket field that records each attachment slot
+ATTACHMENT_FIELDS = {"images": "image_url", "docs": "docs_url"}
+# Field holding the URLs of an image's derivatives ({"thumbnail": url, "model": url, "web": url})
+IMAGE_VARIANTS_FIELD = "image_variants"
+# Fields only the attachment endpoints write; they decide which stored files a ticket holds
+MANAGED_FIELDS = {*ATTACHMENT_FIELDS.values(), IMAGE_VARIANTS_FIELD}
+
+# Variant renders scheduled after a request returns; referenced here so they are not garbage collected
+_background_renders: Set[asyncio.Task] = set()
+
+
+def _content_type(file: UploadFile) -> str:
+    # Use the provided content type, or guess it from the filename
+    return file.content_type or mimetypes.guess_type(file.filename)[0] or "application/octet-stream"
+
+
+def _holder(ticket_id, field: str, report: bool = False) -> str:
+    # The reference a ticket's (or its report's) attachment slot holds on stored content
+    return f"{'report:' if report else ''}{ticket_id}:{field}"
+
 
 class TicketService:
-    def __init__(self, ticket_repository: TicketRepository, notification_service: NotificationService, user_repository: UserRepository):
+    def __init__(
+        self,
+        ticket_repository: TicketRepository,
+        notification_service: NotificationService,
+        user_repository: UserRepository,
+        storage: StorageBackend,
+        file_store: FileStore,
+    ):
         self.ticket_repository = ticket_repository
         self.notification_service = notification_service
         self.user_repository = user_repository
+        self.storage = storage
+        self.file_store = file_store
 
-    async def get_tickets(self, current_user: dict, status: Optional[str] = None):
+    async def get_tickets(
+        self,
+        current_user: dict,
+        status: Optional[str] = None,
+        limit: int = DEFAULT_PAGE_SIZE,
+        cursor: Optional[str] = None,
+        created_after: Optional[datetime] = None,
+        created_before: Optional[datetime] = None,
+        newest_first: bool = True,
+    ) -> Tuple[List[dict], Optional[str]]:
         """
-        Get tickets based on the user's role and optional status filter.
+        Get one page of tickets based on the user's role and optional filters.
         - Admin: All tickets
         - Doctor: Assigned tickets
         - Patient: Own tickets
+        - Status and creation date filters are applied by the database query.
+        - Returns the tickets and an opaque cursor for the next page, or None.
         """
-        if current_user["role"] == "admin":
-            tickets = await self.ticket_repository.get_all_tickets()
-        elif current_user["role"] == "doctor":
-            tickets = await self.ticket_repository.get_tickets_by_doctor(current_user["_id"])
-        elif current_user["role"] == "patient":
-            tickets = await self.ticket_repository.get_tickets_by_patient(current_user["_id"])
-        else:
+        if current_user["role"] not in ("admin", "doctor", "patient"):
             raise UnauthorizedAccessException("Unauthorized access")
 
-        if status:
-            tickets = [ticket for ticket in tickets if ticket.get("status") == status]
-            
-        return convert_objectids_to_strings(tickets)
+        tickets, next_cursor = await self.ticket_repository.find_tickets(
+            role=current_user["role"],
+            user_id=current_user["_id"],
+            status=status,
+            created_after=created_after,
+            created_before=created_before,
+            newest_first=newest_first,
+            limit=limit,
+            cursor=cursor,
+        )
+        return tickets, next_cursor
 
     async def get_ticket_by_id(self, ticket_id: str, current_user: dict):
         """
@@ -46,118 +105,319 @@ class TicketService:
 
         # Role-based access control
         if current_user["role"] == "admin":
-            return convert_objectids_to_strings(ticket)
+            return ticket
         elif current_user["role"] == "doctor" and ticket["assigned_doctor_id"] == current_user["_id"]:
-            return convert_objectids_to_strings(ticket)
+            return ticket
         elif current_user["role"] == "patient" and ticket["patient_id"] == current_user["_id"]:
-            return convert_objectids_to_strings(ticket)
+            return ticket
         else:
             raise UnauthorizedAccessException("Unauthorized access")
 
     async def upload_file(self, file: UploadFile, ticket_id: str, file_type: str):
         """
-        Upload a file to Google Cloud Storage and return the public URL.
+        Upload a ticket attachment to storage and return its public URL.
+        - Content already stored (e.g. the same lab report on another ticket) is reused, not uploaded again.
+        - The ticket's slot is recorded as a reference to the content; release it with release_uploads.
+        """
+        return await self._put_upload(file, _holder(ticket_id, ATTACHMENT_FIELDS[file_type]), "Failed to upload file")
+
+    async def upload_report_file(self, file: UploadFile, ticket_id: str, file_type: str):
+        """
+        Upload a report file (image or document) to storage and return its public URL.
+        """
+        return await self._put_upload(
+            file, _holder(ticket_id, ATTACHMENT_FIELDS[file_type], report=True), "Failed to upload report file"
+        )
+
+    async def upload_attachments(
+        self, ticket_id, image: Optional[UploadFile], document: Optional[UploadFile], report: bool = False
+    ) -> Dict:
+        """
+        Upload a ticket's (or report's) image, with its derivatives, and document concurrently.
+        - Returns the fields to record: `image_url`, `image_variants` and `docs_url`.
+        - If either upload fails, the other is released before the error is raised.
+        """
+        async def upload_document():
+            upload = self.upload_report_file if report else self.upload_file
+            return {"docs_url": await upload(document, ticket_id, "docs")}
+
+        uploads = []
+        if image:
+            uploads.append(self.upload_image(image, ticket_id, report))
+        if document:
+            uploads.append(upload_document())
+        results = await asyncio.gather(*uploads, return_exceptions=True)
+
+        fields = {}
+        for result in results:
+            if not isinstance(result, BaseException):
+                fields.update(result)
+        errors = [result for result in results if isinstance(result, BaseException)]
+        if errors:
+            await self.release_uploads(ticket_id, fields, report)
+            raise errors[0]
+        return fields
+
+    async def release_uploads(self, ticket_id, fields: Dict, report: bool = False):
+        """
+        Release the attachments recorded in a ticket's (or report's) `fields`, e.g. once the
+        ticket is deleted or when it could not be stored after its uploads.
         """
+        for field in ATTACHMENT_FIELDS.values():
+            await self._release_attachment(ticket_id, field, fields.get(field), report)
+
+    async def _release_attachment(self, ticket_id, field: str, url: Optional[str], report: bool = False):
+        """
+        Let go of the attachment a ticket slot pointed at; failures are logged, not raised.
+        """
+        path = self.storage.path_from_url(url) if url else None
+        if path is None:
+            return
         try:
-            # Upload file to GCS
-            file_url = await upload_ticket_to_gcs(
-                bucket_name=settings.GOOGLE_CLOUD_BUCKET_NAME,
-                file=file,
-                ticket_id=ticket_id,  # Use ticket_id for folder structure
-                file_type=file_type,
-            )
-            return file_url
+            if path.startswith(f"tickets/{ticket_id}/"):
+                # Direct uploads (see create_attachment_upload) belong to this ticket alone
+                paths = [path]
+                if field == ATTACHMENT_FIELDS["images"]:
+                    base = os.path.splitext(path)[0]
+                    paths += [f"{base}.{name}{VARIANT_EXTENSION}" for name in IMAGE_VARIANTS]
+                await asyncio.gather(*(self.storage.delete(path) for path in paths))
+            else:
+                # Content-addressed files are only released if this slot holds a reference
+                await self.file_store.release(path, _holder(ticket_id, field, report))
         except Exception as e:
-            raise Exception(f"Failed to upload file: {e}")
+            print(f"Failed to release attachment {path}: {e}")
 
-    async def upload_report_file(self, file: UploadFile, ticket_id: str, file_type: str):
+    async def upload_image(self, file: UploadFile, ticket_id: str, report: bool = False) -> Dict:
         """
-        Upload a report file (image or document) to Google Cloud Storage and return the public URL.
+        Upload a ticket (or report) image along with its derivatives.
+        - Returns the fields to record: `image_url` and `image_variants`.
         """
+        if report:
+            image_url = await self.upload_report_file(file, ticket_id, "images")
+        else:
+            image_url = await self.upload_file(file, ticket_id, "images")
+        variants = await self.store_image_variants(attachment_file(file), self.storage.path_from_url(image_url))
+        return {"image_url": image_url, IMAGE_VARIANTS_FIELD: variants}
+
+    async def store_image_variants(self, source: BinaryIO, path: str) -> Dict[str, str]:
+        """
+        Render the derivatives of the image stored at `path` and store them next to it.
+        - Returns the variant URLs by name, or {} if they could not be produced; the original stays usable.
+        """
+        base = os.path.splitext(path)[0]
         try:
-            # Upload file to GCS
-            file_url = await upload_report_file_to_gcs(
-                bucket_name=settings.GOOGLE_CLOUD_BUCKET_NAME,
-                file=file,
-                ticket_id=ticket_id,  # Use ticket_id for folder structure
-                file_type=file_type,
-            )
-            return file_url
+            # Stored content that was uploaded before already has its variants
+            paths = await self.file_store.get_variants(path)
+            if not paths:
+                # The worker process opens the file itself rather than receiving its bytes
+                async with worker_file(source) as image:
+                    rendered = await render_image_variants(image)
+                paths = {name: f"{base}.{name}{VARIANT_EXTENSION}" for name in rendered}
+                await asyncio.gather(
+                    *(self.storage.put(paths[name], io.BytesIO(content), VARIANT_CONTENT_TYPE) for name, content in rendered.items())
+                )
+                await self.file_store.set_variants(path, paths)
         except Exception as e:
-            raise Exception(f"Failed to upload report file: {e}")
+            print(f"Failed to create image variants for {path}: {e}")
+            return {}
+        return {name: self.storage.public_url(variant_path) for name, variant_path in paths.items()}
+
+    async def _put_upload(self, file: UploadFile, holder: str, error_message: str) -> str:
+        try:
+            path = await self.file_store.put(attachment_file(file), file.filename, _content_type(file), holder)
+            return self.storage.public_url(path)
+        except (AttachmentTooLargeException, StorageCapacityException, StorageTimeoutException):
+            raise
+        except Exception as e:
+            raise Exception(f"{error_message}: {e}")
+
+    async def open_attachment(self, url: str) -> Optional[BinaryIO]:
+        """
+        Stream an attachment stored by this service into a spooled temporary file; the caller closes it.
+        - Returns None for URLs that do not point into storage.
+        """
+        path = self.storage.path_from_url(url)
+        if path is None:
+            return None
+        return await spool_chunks(self.storage.stream(path))
+
+    async def get_document_text(self, url: str) -> Optional[str]:
+        """
+        Text previously extracted from the stored document at `url`, if cached.
+        """
+        path = self.storage.path_from_url(url)
+        return await self.file_store.get_text(path) if path else None
+
+    async def cache_document_text(self, url: str, text: str):
+        """
+        Remember the text extracted from the stored document at `url`, keyed by its content.
+        """
+        path = self.storage.path_from_url(url)
+        if path:
+            await self.file_store.set_text(path, text)
+
+    async def create_attachment_upload(
+        self, ticket_id: str, file_type: str, filename: str, content_type: str, current_user: dict
+    ) -> Tuple[str, UploadTarget]:
+        """
+        Issue a short-lived URL for uploading a ticket attachment straight to storage (ticket owner only).
+        - Returns the storage path to confirm afterwards and the upload target.
+        """
+        if current_user["role"] != "patient":
+            raise UnauthorizedAccessException("Unauthorized access")
+        ticket = await self.get_ticket_by_id(ticket_id, current_user)
+
+        path = f"tickets/{ticket['_id']}/{file_type}/{uuid.uuid4()}{os.path.splitext(filename)[1]}"
+        return path, await self.storage.create_upload_target(path, content_type, MAX_ATTACHMENT_BYTES)
+
+    async def confirm_attachment(self, ticket_id: str, file_type: str, path: str, current_user: dict):
+        """
+        Record a directly uploaded attachment on the ticket once it is verified to be in storage.
+        """
+        # Storage is only looked at for the ticket's owner
+        if current_user["role"] != "patient":
+            raise UnauthorizedAccessException("Unauthorized access")
+        ticket = await self.get_ticket_by_id(ticket_id, current_user)
+
+        # Only paths issued for this ticket and slot are accepted
+        prefix = f"tickets/{ticket_id}/{file_type}/"
+        name = path[len(prefix):]
+        if not path.startswith(prefix) or not name or "/" in name or name.startswith("."):
+            raise InvalidAttachmentException("Attachment path was not issued for this ticket")
+
+        stored = await self.storage.stat(path)
+        if stored is None:
+            raise AttachmentNotFoundException("Attachment has not been uploaded")
+        if stored.size > MAX_ATTACHMENT_BYTES:
+            raise InvalidAttachmentException("Attachment is too large")
+
+        field = ATTACHMENT_FIELDS[file_type]
+        url = self.storage.public_url(path)
+        update = {field: url}
+        if file_type == "images":
+            # The previous image's derivatives no longer apply; the new ones are filled in once rendered
+            update[IMAGE_VARIANTS_FIELD] = {}
+        previous_url = ticket.get(field)
+        ticket = await self._update_own_ticket(ticket_id, update, current_user)
+        if previous_url != url:
+            await self._release_attachment(ticket_id, field, previous_url)
+        if file_type == "images":
+            task = asyncio.get_running_loop().create_task(self._render_confirmed_image(ticket_id, path, url))
+            _background_renders.add(task)
+            task.add_done_callback(_background_renders.discard)
+        return ticket
+
+    async def _render_confirmed_image(self, ticket_id: str, path: str, url: str):
+        """
+        Render and record the variants of a directly uploaded image, in the background.
+        """
+        try:
+            source = await spool_chunks(self.storage.stream(path))
+            try:
+                variants = await self.store_image_variants(source, path)
+            finally:
+                source.close()
+            if variants:
+                # Skipped if the ticket has moved on to another image meanwhile
+                await self.ticket_repository.update_ticket(
+                    ticket_id, {IMAGE_VARIANTS_FIELD: variants}, conditions={"image_url": url}
+                )
+        except Exception as e:
+            print(f"Failed to render variants of {path}: {e}")
 
     async def create_ticket(self, ticket_data: dict):
         """
         Create a new ticket and notify the admin in real time.
+        - Attachments already uploaded for it (see upload_attachments) are released if it cannot be stored.
         """
         # Create the ticket
-        ticket = await self.ticket_repository.create_ticket(ticket_data)
+        try:
+            ticket = await self.ticket_repository.create_ticket(ticket_data)
+        except BaseException:
+            if "_id" in ticket_data:
+                await self.release_uploads(ticket_data["_id"], ticket_data)
+            raise
 
         # Patient name
         patient = await self.user_repository.get_user_by_id(ticket["patient_id"])
 
         # Notify admin
-        admins = await self.user_repository.get_users_by_role_and_status("admin", "accepted")
-        for admin in admins:
-            if admin["fcm_token"]:
-                await self.notification_service.create_notification(
-                    user_id=admin["_id"],
-                    message=f"New ticket created by {patient['username']}",
-                    type="ticket_created",
-                    fcm_token=admin["fcm_token"],
-                )
-        return convert_objectids_to_strings(ticket)
+        admins = await self.user_repository.get_recipients("admin")
+        await self.notification_service.notify_users(
+            admins,
+            message=f"New ticket created by {patient['username']}",
+            type="ticket_created",
+        )
+        return ticket
 
     async def update_ticket(self, ticket_id: str, update_data: dict, current_user: dict):
         """
         Update a ticket (patient only).
+        - Attachment fields cannot be set here; they go through the attachment endpoints.
         """
-        ticket = await self.ticket_repository.get_ticket_by_id(ticket_id)
-        if not ticket:
-            raise TicketNotFoundException("Ticket not found")
-        if current_user["role"] != "patient" or ticket["patient_id"] != current_user["_id"]:
+        if any(key.split(".")[0] in MANAGED_FIELDS for key in update_data):
+            raise InvalidAttachmentException("Attachments can only be changed through the attachment endpoints")
+        return await self._update_own_ticket(ticket_id, update_data, current_user)
+
+    async def _update_own_ticket(self, ticket_id: str, update_data: dict, current_user: dict):
+        if current_user["role"] != "patient":
             raise UnauthorizedAccessException("Unauthorized access")
 
-        updated_ticket = await self.ticket_repository.update_ticket(ticket_id, update_data)
-        return convert_objectids_to_strings(updated_ticket)
+        # Ownership is part of the update filter, so the happy path is a single round trip
+        updated_ticket = await self.ticket_repository.update_ticket(
+            ticket_id, update_data, conditions={"patient_id": current_user["_id"]}
+        )
+        if not updated_ticket:
+            await self._raise_missing_or_forbidden(ticket_id)
+        return updated_ticket
 
     async def delete_ticket(self, ticket_id: str, current_user: dict):
         """
         Delete a ticket (patient only).
         """
-        ticket = await self.ticket_repository.get_ticket_by_id(ticket_id)
-        if not ticket:
-            raise TicketNotFoundException("Ticket not found")
-        if current_user["role"] != "patient" or ticket["patient_id"] != current_user["_id"]:
+        if current_user["role"] != "patient":
             raise UnauthorizedAccessException("Unauthorized access")
 
-        await self.ticket_repository.delete_ticket(ticket_id)
+        deleted = await self.ticket_repository.delete_ticket(
+            ticket_id, conditions={"patient_id": current_user["_id"]}
+        )
+        if not deleted:
+            await self._raise_missing_or_forbidden(ticket_id)
+
+        # Release the ticket's attachments; content no longer referenced anywhere is deleted
+        await self.release_uploads(ticket_id, deleted)
         return {"message": "Ticket deleted successfully"}
 
-    async def assign_doctor(self, ticket_id: str, doctor_id: str):
+    async def _raise_missing_or_forbidden(self, ticket_id: str):
         """
-        Assign a doctor to a ticket and notify the doctor.
+        Explain why a conditional write matched nothing: the ticket is missing or not the caller's.
         """
-        ticket = await self.ticket_repository.get_ticket_by_id(ticket_id)
-        if not ticket:
+        if not await self.ticket_repository.get_ticket_by_id(ticket_id):
             raise TicketNotFoundException("Ticket not found")
+        raise UnauthorizedAccessException("Unauthorized access")
 
-        # Assign the doctor
+    async def assign_doctor(self, ticket_id: str, doctor_id: str):
+        """
+        Assign a doctor to a ticket and notify the doctor.
+        """
+        # Assign the doctor, getting the updated ticket back in the same round trip
         updated_ticket = await self.ticket_repository.update_ticket(
             ticket_id, {"assigned_doctor_id": ObjectId(doctor_id)}
         )
+        if not updated_ticket:
+            raise TicketNotFoundException("Ticket not found")
 
         # Notify the doctor
         doctor = await self.user_repository.get_user_by_id(doctor_id)
         if doctor and doctor.get("fcm_token"):
             await self.notification_service.create_notification(
                 user_id=doctor["_id"],
-                message = f"A new ticket titled '{ticket['title']}' has been assigned to you.",
+                message = f"A new ticket titled '{updated_ticket['title']}' has been assigned to you.",
                 type="ticket_assigned",
                 fcm_token=doctor["fcm_token"],
             )
 
-        return convert_objectids_to_strings(updated_ticket)
+        return updated_ticket
 
     async def submit_report(self, ticket_id: str, report_data: dict, current_user: dict):
         """
@@ -182,18 +442,22 @@ class TicketService:
                 fcm_token=patient["fcm_token"],
             )
 
-        return convert_objectids_to_strings(updated_ticket)
+        return updated_ticket
     
     async def get_ticket_with_files(self, ticket_id: str) -> dict:
         """
-        Fetch ticket details and download files from GCS.
+        Fetch ticket details and open its files from storage; the caller closes `image` and `document`.
         """
         ticket = await self.ticket_repository.get_ticket_by_id(ticket_id)
         if not ticket:
             raise TicketNotFoundException("Ticket not found")
 
-        # Download files from GCS
-        ticket["image"] = download_file_from_gcs(ticket["image_url"]) if ticket.get("image_url") else None
-        ticket["document"] = download_file_from_gcs(ticket["docs_url"]) if ticket.get("docs_url") else None
+        # Open both files concurrently, off the event loop
+        async def open_file(url: Optional[str]):
+            return await self.open_attachment(url) if url else None
+
+        ticket["image"], ticket["document"] = await asyncio.gather(
+            open_file(ticket.get("image_url")), open_file(ticket.get("docs_url"))
+        )
 
-        return ticket
\ No newline at end of file
+        return ticket
@@ -5,7 +5,7 @@ from app.utils.mongo_utils import convert_objectids_to_strings
 from app.repositories.user_repository import UserRepository
 from app.services.notification_service import NotificationService
 from app.repositories.notification_repository import NotificationRepository
-from app.core.security import hash_password
+from app.core.security import hash_password_async
 from app.core.exceptions import (
     UserAlreadyExistsException,
     UserNotFoundException,
@@ -29,22 +29,19 @@ class UserService:
             raise UserAlreadyExistsException("Email already exists")
 
         # Hash the password before saving
-        user_data["hashed_password"] = hash_password(user_data.pop("password"))
+        user_data["hashed_password"] = await hash_password_async(user_data.pop("password"))
         user_data["created_at"] = datetime.utcnow()
 
         # Create the user
         user = await self.user_repository.create_user(user_data)
 
         # Notify admins
-        admins = await self.user_repository.get_users_by_role_and_status("admin", "accepted")
-        for admin in admins:
-            if admin.get("fcm_token"):
-                await self.notification_service.create_notification(
-                    user_id=admin["_id"],
-                    message = f"A new user has registered with the username {user_data['username']}.",
-                    type="user_registered",
-                    fcm_token=admin["fcm_token"],
-                )
+        admins = await self.user_repository.get_recipients("admin")
+        await self.notification_service.notify_users(
+            admins,
+            message=f"A new user has registered with the username {user_data['username']}.",
+            type="user_registered",
+        )
         user["user_id"] = str(user["_id"])
         convert_objectids_to_strings(user)
         return UserResponse(**user)
@@ -106,14 +103,15 @@ class UserService:
         flattened_update_data = flatten_dict(update_data)
         flattened_update_data = {k: v for k, v in flattened_update_data.items() if v is not None}
 
-        # Update other fields with $set
+        # Update other fields with $set, getting the updated document back in the same round trip
         if flattened_update_data:
-            await self.user_repository.update_user(
+            updated_user = await self.user_repository.update_user(
                 user_id,
                 flattened_update_data
             )
+        else:
+            updated_user = await self.user_repository.get_user_by_id(user_id)
 
-        updated_user = await self.user_repository.get_user_by_id(user_id)
         if not updated_user:
             raise UserNotFoundException("User not found after update")
         updated_user["user_id"] = str(updated_user["_id"])
@@ -157,7 +155,7 @@ class UserService:
         users = await self.user_repository.get_users_by_status(status)
         if not users:
             raise UserNotFoundException("No users found")
-        return convert_objectids_to_strings(users)
+        return users
 
     async def update_fcm_token(self, user_id: str, fcm_token: str):
         """
@@ -1,5 +1,13 @@
-from bson import ObjectId
-from typing import Dict, List, Union
+import base64
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from enum import Enum
+from uuid import UUID
+from bson import Decimal128, ObjectId
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from typing import Any, Dict, List, Union
 
 def convert_objectids_to_strings(data: Union[Dict, List]) -> Union[Dict, List]:
     """
@@ -17,4 +25,45 @@ def convert_objectids_to_strings(data: Union[Dict, List]) -> Union[Dict, List]:
                 data[index] = str(item)
             elif isinstance(item, (dict, list)):
                 data[index] = convert_objectids_to_strings(item)
-    return data
\ No newline at end of file
+    return data
+
+def bson_json_default(value: Any) -> Any:
+    """
+    `default` hook for json.dumps that understands the BSON types Mongo documents contain.
+    - Called only for values the C encoder cannot handle, so plain fields cost nothing extra.
+    """
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal128):
+        return str(value.to_decimal())
+    if isinstance(value, (Decimal, UUID)):
+        return str(value)
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, bytes):
+        return base64.b64encode(value).decode()
+    if isinstance(value, BaseModel):
+        return value.model_dump() if hasattr(value, "model_dump") else value.dict()
+    if isinstance(value, (set, frozenset, tuple)):
+        return list(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class MongoJSONResponse(JSONResponse):
+    """
+    JSON response that serializes raw Mongo documents in a single pass.
+    - Replaces convert_objectids_to_strings followed by FastAPI's jsonable_encoder,
+      which walked every document twice.
+    - Return it directly from a route so FastAPI skips jsonable_encoder entirely.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return json.dumps(
+            content,
+            default=bson_json_default,
+            ensure_ascii=False,
+            allow_nan=False,
+            separators=(",", ":"),
+        ).encode("utf-8")
@@ -0,0 +1,60 @@
+import base64
+import binascii
+from typing import Dict, List, Optional, Tuple
+from bson import ObjectId
+from bson.errors import InvalidId
+from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo import DESCENDING
+from app.core.exceptions import InvalidCursorException
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+def encode_cursor(last_id: ObjectId) -> str:
+    """
+    Encode the _id of the last document on a page as an opaque, URL-safe token.
+    """
+    return base64.urlsafe_b64encode(last_id.binary).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> ObjectId:
+    """
+    Decode a token produced by encode_cursor.
+    - Raises InvalidCursorException for anything that was not issued by this API.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        return ObjectId(raw)
+    except (binascii.Error, InvalidId, TypeError, ValueError):
+        raise InvalidCursorException("Invalid pagination cursor")
+
+
+async def fetch_page(
+    collection: AsyncIOMotorCollection,
+    query: Dict,
+    limit: int = DEFAULT_PAGE_SIZE,
+    cursor: Optional[str] = None,
+    projection: Optional[Dict] = None,
+    direction: int = DESCENDING,
+) -> Tuple[List[Dict], Optional[str]]:
+    """
+    Fetch one page of documents using keyset pagination on _id.
+    - Newest first by default; pass direction=ASCENDING for oldest first.
+    - Returns the documents and the cursor for the next page (None on the last page).
+    - Reads limit + 1 documents to know whether another page exists without a count.
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    if cursor:
+        keyset = {"$lt" if direction == DESCENDING else "$gt": decode_cursor(cursor)}
+        # Keep any _id range already in the query (e.g. a date filter) alongside the keyset bound
+        query = {"$and": [query, {"_id": keyset}]} if "_id" in query else {**query, "_id": keyset}
+
+    documents = await (
+        collection.find(query, projection).sort("_id", direction).limit(limit + 1).to_list(length=limit + 1)
+    )
+    next_cursor = None
+    if len(documents) > limit:
+        documents = documents[:limit]
+        next_cursor = encode_cursor(documents[-1]["_id"])
+    return documents, next_cursor
@@ -0,0 +1,92 @@
+"""
+Micro-benchmark: MongoJSONResponse vs convert_objectids_to_strings + jsonable_encoder.
+
+Builds ticket- and user-shaped documents as Motor returns them (ObjectIds,
+datetimes, nested patient data) and times how long each path takes to turn a
+list of them into response bytes.
+
+    python -m benchmarks.json_response [--docs 2000] [--repeat 20]
+"""
+import argparse
+import copy
+import time
+from datetime import datetime, timedelta
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from app.utils.mongo_utils import MongoJSONResponse, convert_objectids_to_strings
+
+
+def make_ticket(i: int) -> dict:
+    return {
+        "_id": ObjectId(),
+        "title": f"Ticket {i}",
+        "description": "Persistent headache and mild fever for three days. " * 3,
+        "patient_id": ObjectId(),
+        "assigned_doctor_id": ObjectId(),
+        "bp": "140/90",
+        "sugar_level": "120",
+        "weight": 72.5,
+        "symptoms": "headache, fever",
+        "status": "pending" if i % 3 else "resolved",
+        "image_url": f"https://storage.googleapis.com/bucket/tickets/{i}/images/x.jpg",
+        "created_at": datetime.utcnow() - timedelta(minutes=i),
+    }
+
+
+def make_user(i: int) -> dict:
+    return {
+        "_id": ObjectId(),
+        "username": f"patient{i}",
+        "email": f"patient{i}@example.com",
+        "role": "patient",
+        "status": "accepted",
+        "created_at": datetime.utcnow(),
+        "patient_data": {
+            "medical_conditions": ["hypertension", "asthma"],
+            "medications": ["amlodipine", "salbutamol", "metformin"],
+            "allergies": ["penicillin"],
+            "age": 42.0,
+            "height": 172.0,
+            "weight": 80.0,
+            "blood_group": "O+",
+        },
+    }
+
+
+def legacy_path(documents: list) -> bytes:
+    # What the routes did before: mutate ids to strings, then let FastAPI encode
+    return JSONResponse(jsonable_encoder(convert_objectids_to_strings(documents))).body
+
+
+def single_pass_path(documents: list) -> bytes:
+    return MongoJSONResponse(documents).body
+
+
+def bench(name: str, func, documents: list, repeat: int) -> float:
+    # The legacy path mutates its input, so every run gets a fresh copy made outside the timer
+    inputs = [copy.deepcopy(documents) for _ in range(repeat)]
+    started = time.perf_counter()
+    for batch in inputs:
+        func(batch)
+    elapsed = (time.perf_counter() - started) / repeat
+    print(f"  {name:<12} {elapsed * 1000:8.2f} ms/response")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    for label, factory in (("tickets", make_ticket), ("users", make_user)):
+        documents = [factory(i) for i in range(args.docs)]
+        print(f"{label} x {args.docs}:")
+        legacy = bench("legacy", legacy_path, documents, args.repeat)
+        single = bench("single-pass", single_pass_path, documents, args.repeat)
+        print(f"  speedup      {legacy / single:8.2f}x")
+
+
+if __name__ == "__main__":
+    main()